@@ -0,0 +1,334 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Offline benchmark for the HumbleBundle Downloader.
+
+Starts a local stand-in for the Humble library page, order API and CDN and
+runs the downloader's own fetch, download and verify code against synthetic
+libraries, reporting keys/sec, MB/s, verification MB/s and peak RSS.
+
+Arguments the benchmark doesn't know are passed on to the downloader, e.g.
+`python benchmark.py --orders 1000 -- --jobs 4 --batch-size 40`
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from urllib.parse import parse_qs, urlparse
+
+import humble_download
+
+BLOCK_SIZE = 64 * 1024
+METADATA_FILE_SIZE = 4 * 1024  # Size of the files that are only listed, never downloaded
+
+
+def file_block(name: str) -> bytes:
+    """Repeating content block of a synthetic file, unique per file name."""
+    seed = hashlib.sha256(name.encode()).digest()
+    return (seed * (BLOCK_SIZE // len(seed)))[:BLOCK_SIZE]
+
+
+def iter_file_content(name: str, start: int, end: int):
+    """Yield the bytes start..end (exclusive) of a synthetic file."""
+    block = file_block(name)
+    position = start
+    while position < end:
+        offset = position % BLOCK_SIZE
+        chunk = block[offset:min(BLOCK_SIZE, offset + end - position)]
+        position += len(chunk)
+        yield chunk
+
+
+class StubHumbleServer:
+    """Local stand-in for the Humble library page, order endpoints and CDN."""
+
+    def __init__(self, orders: int, download_files: int, file_size: int, latency: float = 0.0,
+                 failure_rate: float = 0.0, content_length: bool = True):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.content_length = content_length
+        self.orders: Dict[str, Dict] = {}
+        self.files: Dict[str, int] = {}
+        self.requests = 0
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.base_url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        self._build_library(orders, download_files, file_size)
+
+    def _build_library(self, orders: int, download_files: int, file_size: int):
+        for i in range(orders):
+            gamekey = f"bench{i:06d}"
+            machine_name = f"bench_item_{i:06d}"
+            filename = f"{machine_name}.pdf"
+            size = file_size if i < download_files else METADATA_FILE_SIZE
+            self.files[filename] = size
+
+            md5, sha1 = hashlib.md5(), hashlib.sha1()
+            for chunk in iter_file_content(filename, 0, size):
+                md5.update(chunk)
+                sha1.update(chunk)
+
+            self.orders[gamekey] = {
+                'gamekey': gamekey,
+                'product': {'machine_name': f"bench_bundle_{i:06d}", 'human_name': f"Benchmark Bundle {i}"},
+                'subproducts': [{
+                    'human_name': f"Benchmark Item {i}",
+                    'machine_name': machine_name,
+                    'downloads': [{
+                        'platform': 'ebook',
+                        'download_struct': [{
+                            'name': 'PDF',
+                            'url': {'web': f"{self.base_url}/files/{filename}?ttl=3600"},
+                            'human_size': f"{size / 1048576:.1f} MB",
+                            'file_size': size,
+                            'md5': md5.hexdigest(),
+                            'sha1': sha1.hexdigest()
+                        }]
+                    }]
+                }]
+            }
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True  # Headers and body go out as separate writes, don't wait for ACKs
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, code: int, body: bytes, content_type: str = 'application/json'):
+                self.send_response(code)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                stub.requests += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                if stub.failure_rate and random.random() < stub.failure_rate:
+                    return self._send(503, b'{"error": "injected failure"}')
+
+                url = urlparse(self.path)
+                if url.path == '/home/library':
+                    return self._library()
+                if url.path.startswith('/api/v1/order/'):
+                    order = stub.orders.get(url.path.rsplit('/', 1)[1])
+                    if order is None:
+                        return self._send(404, b'{}')
+                    return self._send(200, json.dumps(order).encode())
+                if url.path == '/api/v1/orders':
+                    keys = parse_qs(url.query).get('gamekeys', [])
+                    orders = {key: stub.orders[key] for key in keys if key in stub.orders}
+                    return self._send(200, json.dumps(orders).encode())
+                if url.path.startswith('/files/'):
+                    return self._file(url.path[len('/files/'):])
+                self._send(404, b'{}')
+
+            def _library(self):
+                user_json = json.dumps({'gamekeys': list(stub.orders)})
+                page = ('<html><head><title>Library</title></head><body>'
+                        '<script id="user-home-json-data" type="application/json">\n'
+                        f'  {user_json}\n</script></body></html>')
+                self._send(200, page.encode(), 'text/html')
+
+            def _file(self, filename: str):
+                size = stub.files.get(filename)
+                if size is None:
+                    return self._send(404, b'{}')
+
+                start, end = 0, size
+                byte_range = self.headers.get('Range', '')
+                if byte_range.startswith('bytes='):
+                    first, _, last = byte_range[len('bytes='):].partition('-')
+                    start = int(first or 0)
+                    end = min(size, int(last) + 1) if last else size
+                    if start >= size:
+                        self.send_response(416)
+                        self.send_header('Content-Range', f"bytes */{size}")
+                        self.send_header('Content-Length', '0')
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header('Content-Range', f"bytes {start}-{end - 1}/{size}")
+                else:
+                    self.send_response(200)
+
+                self.send_header('Content-Type', 'application/octet-stream')
+                self.send_header('Accept-Ranges', 'bytes')
+                self.send_header('ETag', f'"{filename}-{size}"')
+                if stub.content_length:
+                    self.send_header('Content-Length', str(end - start))
+                else:
+                    self.close_connection = True  # Body ends when the connection closes
+                self.end_headers()
+                for chunk in iter_file_content(filename, start, end):
+                    self.wfile.write(chunk)
+
+        return Handler
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def _stub_process(options: argparse.Namespace, orders: int, download_files: int, conn):
+    """Serve the stub library until asked to stop, then report the number of requests it answered."""
+    server = StubHumbleServer(orders, download_files, options.file_size, options.latency / 1000,
+                              options.failure_rate, not options.no_content_length)
+    server.start()
+    conn.send(server.base_url)
+    conn.recv()
+    server.stop()
+    conn.send(server.requests)
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1048576 if sys.platform == 'darwin' else peak / 1024
+
+
+def run_scenario(options: argparse.Namespace, orders: int, downloader_args: List[str]) -> Dict:
+    """Run one synthetic library through the downloader and measure every phase."""
+    workdir = tempfile.mkdtemp(prefix='humble-bench-')
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    with open('settings.json', 'w') as f:
+        paths = {'DOWNLOAD_TEMP_PATH': os.path.join(workdir, 'temp'), 'DOWNLOAD_PATH': os.path.join(workdir, 'library')}
+        json.dump({'WINDOWS': paths, 'LINUX': paths}, f)
+    with open('cookie.txt', 'w') as f:
+        f.write('{"_simpleauth_sess": "benchmark"}\n')
+
+    # The stub runs in its own process so its synthetic library doesn't count towards the peak RSS
+    download_files = min(options.download_files, orders)
+    stub, stub_conn = multiprocessing.Pipe()
+    server = multiprocessing.Process(target=_stub_process, args=(options, orders, download_files, stub_conn),
+                                     daemon=True)
+    server.start()
+    base_url = stub.recv()
+
+    args = humble_download.build_parser().parse_args(
+        ['--quiet', '--api-base-url', base_url, '--rate-limit', '0'] + downloader_args)
+    downloader = humble_download.HumbleBundleDownloader(args)
+    downloader._check_cookie()
+    downloader.catalog_store = humble_download.CatalogStore(humble_download.CATALOG_STORE_FILE)
+    result = {'orders': orders}
+
+    try:
+        start = time.perf_counter()
+        keys = downloader._extract_keys_from_library(downloader._get_library())
+        failed_keys = downloader._fetch_orders(keys)
+        elapsed = time.perf_counter() - start
+        result['keys_per_sec'] = len(keys) / elapsed
+        result['failed_keys'] = len(failed_keys)
+
+        start = time.perf_counter()
+        downloader.catalog = downloader.catalog_store.load_catalog(keys)
+        result['catalog_load_sec'] = time.perf_counter() - start
+
+        downloader.inventory.scan(['ebook'])
+        items = list(downloader.catalog.items.values())[:download_files]
+        missing_files = [f"{item.machine_name}.pdf" for item in items]
+        download_bytes = sum(item.download_struct[0].file_size for item in items)
+
+        start = time.perf_counter()
+        downloader._loop_through_missing_files(list(missing_files))
+        elapsed = time.perf_counter() - start
+        result['download_mb_per_sec'] = download_bytes / 1048576 / elapsed if elapsed else 0.0
+
+        downloader.reverify = True
+        verify_jobs = [(item.machine_name, downloader._get_relative_path('ebook', item.machine_name, 'pdf'),
+                        item.download_struct[0].md5, item.download_struct[0].file_size) for item in items]
+        start = time.perf_counter()
+        downloader._verify_existing_files(verify_jobs)
+        elapsed = time.perf_counter() - start
+        result['verify_mb_per_sec'] = download_bytes / 1048576 / elapsed if elapsed else 0.0
+        result['verify_failures'] = len(downloader.md5_no_match_list)
+
+        result['connections_opened'] = downloader.transport.connections_opened
+        result['connections_reused'] = downloader.transport.connections_reused
+        result['peak_rss_mb'] = peak_rss_mb()
+    finally:
+        downloader.transport.close()
+        downloader.checksum_cache.close()
+        downloader.catalog_store.close()
+        stub.send('stop')
+        result['http_requests'] = stub.recv()
+        server.join()
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return result
+
+
+def _scenario_process(options: argparse.Namespace, orders: int, downloader_args: List[str], queue):
+    try:
+        queue.put(run_scenario(options, orders, downloader_args))
+    except BaseException as e:  # The downloader exits on fatal errors, e.g. an unreachable library page
+        queue.put({'orders': orders, 'error': repr(e)})
+
+
+def main():
+    """Benchmark entry point."""
+    parser = argparse.ArgumentParser(description='Offline benchmark for the HumbleBundle Downloader')
+    parser.add_argument('--orders', type=int, nargs='+', default=[100, 1000, 10000],
+                        help='Synthetic library sizes in orders (default: 100 1000 10000)')
+    parser.add_argument('--download-files', type=int, default=20,
+                        help='Number of files downloaded and verified per library (default: 20)')
+    parser.add_argument('--file-size', type=int, default=8 * 1048576,
+                        help='Size in bytes of each downloaded file (default: 8 MiB)')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Milliseconds of latency added to every request (default: 0)')
+    parser.add_argument('--failure-rate', type=float, default=0.0,
+                        help='Fraction of requests answered with 503 (default: 0)')
+    parser.add_argument('--no-content-length',
+                        help='Serves files without a Content-Length header',
+                        action="store_true", required=False)
+    parser.add_argument('--json',
+                        help='Prints the results as JSON',
+                        action="store_true", required=False)
+    options, downloader_args = parser.parse_known_args()
+    downloader_args = [arg for arg in downloader_args if arg != '--']
+
+    results = []
+    for orders in options.orders:
+        # A fresh process per library keeps the peak RSS figures independent
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=_scenario_process, args=(options, orders, downloader_args, queue))
+        process.start()
+        results.append(queue.get())
+        process.join()
+
+    if options.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'orders':>8} {'keys/s':>9} {'load s':>8} {'dl MB/s':>9} {'verify MB/s':>12} "
+          f"{'conns':>7} {'reused':>7} {'peak RSS MB':>12}")
+    for result in results:
+        if 'error' in result:
+            print(f"{result['orders']:>8} failed: {result['error']}")
+            continue
+        print(f"{result['orders']:>8} {result['keys_per_sec']:>9.1f} {result['catalog_load_sec']:>8.2f} "
+              f"{result['download_mb_per_sec']:>9.1f} {result['verify_mb_per_sec']:>12.1f} "
+              f"{result['connections_opened']:>7} {result['connections_reused']:>7} {result['peak_rss_mb']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,30 +6,69 @@ and optimizations following Python best practices.
 """
 import argparse
 import hashlib
+import heapq
+import itertools
 import json
+import mmap
 import os
+import queue
+import random
+import re
 import shutil
+import signal
+import sqlite3
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import deque
+from contextlib import contextmanager, redirect_stdout
 from datetime import datetime
-from os import listdir
+from email.utils import parsedate_to_datetime
 from os.path import isfile, join
 from pathlib import Path
-from typing import Dict, List, Optional, Set
+from typing import Dict, List, Optional, Set, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
 
 import requests
+from requests.adapters import HTTPAdapter
 from termcolor import colored
 
 VERSION = "version 0.3"
+HASH_ALGORITHMS = ('md5', 'sha1')  # Digests computed on the fly while downloading
+CACHED_DIGESTS = HASH_ALGORITHMS + ('sample',)  # Columns of the checksum cache
+VERIFY_LEVELS = ('none', 'size', 'sample', 'full')
+SAMPLE_BLOCKS = 16  # Evenly spaced blocks read by the sample verify level
+SAMPLE_BLOCK_SIZE = 64 * 1024
+FICLONE = 0x40049409  # Linux ioctl that makes a file share the extents of another (btrfs, xfs, ...)
+PLAN_ACTIONS = ('download', 'redownload', 'dedupe', 'skip')
+PLAN_VERSION = 1
+DEDUPE_MODES = ('hardlink', 'reflink')
+STAGING_DIR = '.staging'  # Temp folder below the download path for --stage-on-destination
+CHECKSUM_CACHE_FILE = '.checksum_cache.sqlite'  # Stored in the download path
+CATALOG_STORE_FILE = 'catalog.sqlite'  # Per order cache, stored next to cookie.txt
+SIZE_UNITS = {'': 1, 'b': 1, 'bytes': 1, 'k': 1024, 'kb': 1024, 'm': 1024 ** 2, 'mb': 1024 ** 2,
+              'g': 1024 ** 3, 'gb': 1024 ** 3, 't': 1024 ** 4, 'tb': 1024 ** 4}
+RETRY_BACKOFF_CAP = 300  # Longest wait in seconds between two attempts, unless the server asks for more
+SIDECAR_SAVE_INTERVAL = 64 * 1024 * 1024  # Bytes between two resume point updates
+DOWNLOAD_ORDERS = ('name', 'smallest', 'largest')
+WEIRD_NAMES = ('download', 'supplement', 'mp3', 'companion file', 'installer', '.zip')
 COOKIE = ""  # Static value from file
-URL_ORDER = "https://www.humblebundle.com:443/api/v1/order/"
-URL_LIBRARY = "https://www.humblebundle.com:443/home/library"
+API_BASE_URL = "https://www.humblebundle.com:443"
+URL_ORDER = API_BASE_URL + "/api/v1/order/"
+URL_ORDERS = API_BASE_URL + "/api/v1/orders"  # Takes several gamekeys parameters per request
+URL_LIBRARY = API_BASE_URL + "/home/library"
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:63.0) Gecko/20100101 Firefox/126.0",
     "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
     "Accept-Language": "en-US,en;q=0.5",
     "Accept-Encoding": "gzip, deflate",
     "DNT": "1",
-    "Connection": "close",
+    "Connection": "keep-alive",
     "Upgrade-Insecure-Requests": "1"
 }
 
@@ -43,15 +82,888 @@ header = """
 """
 
 
+class RateLimiter:
+    """Thread-safe limiter that spaces out calls to a maximum rate per second."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def wait(self):
+        """Block until the caller is allowed to make its next call."""
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def retry_after_seconds(response: Optional[requests.Response]) -> Optional[float]:
+    """Seconds a 429 or 503 response asks to wait before the next request, None if it doesn't say."""
+    if response is None or response.status_code not in (429, 503):
+        return None
+    value = response.headers.get('retry-after', '').strip()
+    if not value:
+        return None
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryQueue:
+    """Thread-safe work queue where failed items can be put back with a delay.
+
+    Due items come out in FIFO order, so a deferred item waits behind the healthy ones.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._ready = deque()
+        self._delayed: List[Tuple[float, int, object]] = []  # heap of (due, sequence, item)
+        self._sequence = itertools.count()
+        self._closed = False
+
+    def put(self, item, delay: float = 0.0):
+        with self._cond:
+            if delay > 0:
+                heapq.heappush(self._delayed, (time.monotonic() + delay, next(self._sequence), item))
+            else:
+                self._ready.append(item)
+            self._cond.notify()
+
+    def get(self):
+        """Block until an item is due, returns None once the queue is closed and drained."""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                while self._delayed and self._delayed[0][0] <= now:
+                    self._ready.append(heapq.heappop(self._delayed)[2])
+                if self._ready:
+                    return self._ready.popleft()
+                if self._closed and not self._delayed:
+                    return None
+                self._cond.wait(self._delayed[0][0] - now if self._delayed else None)
+
+    def close(self, discard: bool = False):
+        """Hand out None once drained, discard drops the items that are still queued."""
+        with self._cond:
+            self._closed = True
+            if discard:
+                self._ready.clear()
+                self._delayed.clear()
+            self._cond.notify_all()
+
+    def qsize(self) -> int:
+        with self._cond:
+            return len(self._ready)
+
+
+def parse_size(text: str) -> int:
+    """Parse sizes like '1.5 GB', '512 kB', '10M' or '123 bytes' into bytes, 0 if unknown."""
+    match = re.match(r'^\s*([\d.]+)\s*([a-z]*)\s*$', str(text).lower().replace('ib', 'b'))
+    if not match or match.group(2) not in SIZE_UNITS:
+        return 0
+    try:
+        return int(float(match.group(1)) * SIZE_UNITS[match.group(2)])
+    except ValueError:
+        return 0
+
+
+def size_argument(text: str) -> int:
+    """argparse type for size options, rejects what parse_size can't read instead of treating it as 0."""
+    size = parse_size(text)
+    if size <= 0:
+        raise argparse.ArgumentTypeError(f"invalid size '{text}', expected e.g. 500K, 10M or 1.5GB")
+    return size
+
+
+class TokenBucket:
+    """Thread-safe token bucket limiting the combined byte rate of all downloads."""
+
+    def __init__(self, rate: int, burst: Optional[int] = None):
+        self.rate = rate
+        self.capacity = burst or max(rate, 64 * 1024)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, nbytes: int):
+        """Block until nbytes may pass, large chunks put the bucket in debt for the next caller."""
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 0:
+                    self._tokens -= nbytes
+                    return
+                wait = -self._tokens / self.rate
+            time.sleep(wait)
+
+
+class Metrics:
+    """Thread-safe per-phase timings and counters of a run, exportable as JSON or Prometheus textfile."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.phases: Dict[str, List[float]] = {}  # phase -> [seconds, count]
+        self.counters: Dict[str, float] = {}
+        self.files: List[Dict] = []
+        self.stages: Dict[str, List[float]] = {}  # stage -> [busy seconds, items, max queue depth, queue depth sum]
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time a block of work, concurrent blocks of the same phase add up."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                totals = self.phases.setdefault(name, [0.0, 0])
+                totals[0] += elapsed
+                totals[1] += 1
+
+    @contextmanager
+    def stage(self, name: str, queue_depth: int):
+        """Time one item of a pipeline stage, sampling the depth of the queue that feeds it."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                totals = self.stages.setdefault(name, [0.0, 0, 0, 0])
+                totals[0] += elapsed
+                totals[1] += 1
+                totals[2] = max(totals[2], queue_depth)
+                totals[3] += queue_depth
+
+    def add(self, counter: str, value: float = 1):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def get(self, counter: str) -> float:
+        with self._lock:
+            return self.counters.get(counter, 0)
+
+    def record_file(self, filename: str, nbytes: int, seconds: float):
+        with self._lock:
+            self.files.append({'file': filename, 'bytes': nbytes, 'seconds': round(seconds, 3),
+                               'mb_per_sec': round(nbytes / 1048576 / seconds, 2) if seconds else 0.0})
+
+    def summary(self) -> Dict:
+        with self._lock:
+            phases = {name: {'seconds': round(seconds, 3), 'count': count}
+                      for name, (seconds, count) in self.phases.items()}
+            counters = dict(self.counters)
+            files = list(self.files)
+            stages = {name: {'busy_seconds': round(busy, 3), 'items': items, 'max_queue_depth': max_depth,
+                             'avg_queue_depth': round(depth_sum / items, 2) if items else 0.0}
+                      for name, (busy, items, max_depth, depth_sum) in self.stages.items()}
+
+        def rate(nbytes: float, phase: str) -> float:
+            seconds = phases.get(phase, {}).get('seconds', 0)
+            return round(nbytes / 1048576 / seconds, 2) if seconds else 0.0
+
+        return {
+            'started': self.started,
+            'duration_seconds': round(time.time() - self.started, 3),
+            'phases': phases,
+            'counters': counters,
+            'stages': stages,
+            # Per file download phases overlap with --jobs, the loop's wall time gives the effective rate
+            'download_mb_per_sec': rate(counters.get('bytes_downloaded', 0), 'download_loop'),
+            'verify_mb_per_sec': rate(counters.get('verify_bytes', 0), 'local_verify'),
+            'files': files
+        }
+
+    def write_json(self, filename: str):
+        """Write the summary as JSON, '-' prints it."""
+        if filename == '-':
+            print(json.dumps(self.summary(), indent=2))
+            return
+        with open(filename, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def write_prometheus(self, filename: str):
+        """Write the summary in the node_exporter textfile format, replacing the file atomically."""
+        summary = self.summary()
+        lines = ['# HELP humble_phase_seconds Seconds spent per phase in the last run',
+                 '# TYPE humble_phase_seconds gauge']
+        lines += [f'humble_phase_seconds{{phase="{name}"}} {phase["seconds"]}'
+                  for name, phase in sorted(summary['phases'].items())]
+        for metric, key in (('stage_busy_seconds', 'busy_seconds'), ('stage_max_queue_depth', 'max_queue_depth'),
+                            ('stage_avg_queue_depth', 'avg_queue_depth')):
+            lines += [f'# TYPE humble_{metric} gauge']
+            lines += [f'humble_{metric}{{stage="{name}"}} {stage[key]}'
+                      for name, stage in sorted(summary['stages'].items())]
+        lines += ['# HELP humble_counter Counters of the last run',
+                  '# TYPE humble_counter gauge']
+        lines += [f'humble_counter{{name="{name}"}} {value}' for name, value in sorted(summary['counters'].items())]
+        for name, value in (('duration_seconds', summary['duration_seconds']),
+                            ('download_mb_per_sec', summary['download_mb_per_sec']),
+                            ('verify_mb_per_sec', summary['verify_mb_per_sec']),
+                            ('last_run_timestamp_seconds', round(time.time()))):
+            lines += [f'# TYPE humble_{name} gauge', f'humble_{name} {value}']
+
+        temp_filename = filename + '.tmp'
+        with open(temp_filename, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(temp_filename, filename)
+
+
+class DownloadEntry:
+    """One downloadable format of an item."""
+    __slots__ = ('name', 'web', 'human_size', 'file_size', 'md5', 'sha1', 'filetype')
+
+    def __init__(self, name: str, web: str, human_size: str, file_size: int, md5: str, sha1: str, filetype: str):
+        self.name = name
+        self.web = web
+        self.human_size = human_size
+        self.file_size = file_size
+        self.md5 = md5
+        self.sha1 = sha1
+        self.filetype = filetype  # Extension taken from the URL, empty if the URL has none
+
+
+class CatalogItem:
+    """Downloadable item with a precomputed filetype -> download entry table."""
+    __slots__ = ('human_name', 'machine_name', 'platform', 'download_struct', 'formats')
+
+    def __init__(self, human_name: str, machine_name: str, platform: str, download_struct: List[DownloadEntry]):
+        self.human_name = human_name
+        self.machine_name = machine_name
+        self.platform = platform
+        self.download_struct = download_struct
+        self.formats: Dict[str, DownloadEntry] = {}
+
+        # Resolution order: exact format name, extension in the URL, then the known odd names
+        weird = next((dl for dl in download_struct if dl.name.lower() in WEIRD_NAMES), None)
+        for dl in download_struct:
+            for filetype in (dl.name.lower(), dl.filetype):
+                if filetype and filetype not in self.formats:
+                    self.formats[filetype] = self._resolve(filetype, weird)
+
+    def _resolve(self, filetype: str, weird: Optional[DownloadEntry]) -> Optional[DownloadEntry]:
+        for dl in self.download_struct:
+            if dl.name.lower() == filetype:
+                return dl
+        for dl in self.download_struct:
+            if dl.filetype == filetype:
+                return dl
+        return weird
+
+    def lookup(self, filetype: str) -> Optional[DownloadEntry]:
+        """Return the download entry for a filetype, None if the item doesn't have it."""
+        filetype = filetype.lower()
+        if filetype in self.formats:
+            return self.formats[filetype]
+        return next((dl for dl in self.download_struct if dl.name.lower() in WEIRD_NAMES), None)
+
+
+class Bundle:
+    """Purchased bundle and the items in it that have downloads."""
+    __slots__ = ('gamekey', 'bundle', 'name', 'items')
+
+    def __init__(self, gamekey: str, bundle: str, name: str):
+        self.gamekey = gamekey
+        self.bundle = bundle
+        self.name = name
+        self.items: List[CatalogItem] = []
+
+
+class Catalog:
+    """Parsed library indexed by machine name and platform."""
+    __slots__ = ('bundles', 'items', 'platforms', 'owners')
+
+    def __init__(self):
+        self.bundles: List[Bundle] = []
+        self.items: Dict[str, CatalogItem] = {}
+        self.platforms: Dict[str, List[CatalogItem]] = {}
+        self.owners: Dict[str, str] = {}  # machine name -> gamekey of the order the item was taken from
+
+    def add_bundle(self, bundle: Bundle):
+        self.bundles.append(bundle)
+        for item in bundle.items:
+            # Items sold in several bundles share the machine name, the first one wins
+            key = item.machine_name.lower()
+            if key not in self.items:
+                self.items[key] = item
+                self.platforms.setdefault(item.platform, []).append(item)
+                self.owners[key] = bundle.gamekey
+
+    def get(self, machine_name: str) -> Optional[CatalogItem]:
+        return self.items.get(machine_name.lower())
+
+    def owner(self, machine_name: str) -> Optional[str]:
+        return self.owners.get(machine_name.lower())
+
+    def patch_urls(self, bundle: Bundle) -> int:
+        """Take over the download URLs of a refetched order, returns the number of URLs updated.
+
+        Entries are updated in place, so downloads that already hold them pick up the new URLs.
+        """
+        patched = 0
+        for fresh_item in bundle.items:
+            key = fresh_item.machine_name.lower()
+            item = self.items.get(key)
+            if item is None or self.owners.get(key) != bundle.gamekey:
+                continue
+            fresh = {(dl.name, dl.filetype): dl for dl in fresh_item.download_struct}
+            for dl in item.download_struct:
+                fresh_dl = fresh.get((dl.name, dl.filetype))
+                if fresh_dl and fresh_dl.web != dl.web:
+                    dl.web = fresh_dl.web
+                    patched += 1
+        return patched
+
+
+class FileInventory:
+    """Snapshot of the files in the platform folders, keyed by relative path."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.files: Dict[str, Tuple[int, int]] = {}  # relative path -> (size, mtime_ns)
+        self.dirs: Dict[str, Tuple[int, List[str], List[str]]] = {}  # relative dir -> (mtime_ns, subdirs, files)
+
+    def scan(self, folders: List[str]):
+        """Scan the given top level folders below root in a single pass each."""
+        self.files = {}
+        self.dirs = {}
+        for folder in folders:
+            self._scan_dir(join(self.root, folder), folder)
+
+    def refresh(self, folders: List[str]) -> int:
+        """Bring the snapshot up to date, only listing directories whose mtime changed.
+
+        A directory's mtime changes when entries are added, removed or renamed, files that are
+        rewritten in place keep their old size and mtime here. Returns the number of directories listed.
+        """
+        return sum(self._refresh_dir(join(self.root, folder), folder) for folder in folders)
+
+    def _scan_dir(self, path: str, relative: str):
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+            subdirs, files = [], []
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    entry_relative = f"{relative}/{entry.name}"
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.name)
+                        self._scan_dir(entry.path, entry_relative)
+                    elif entry.is_file():
+                        stat = entry.stat()
+                        self.files[entry_relative] = (stat.st_size, stat.st_mtime_ns)
+                        files.append(entry.name)
+            self.dirs[relative] = (mtime_ns, subdirs, files)
+        except FileNotFoundError:
+            pass
+
+    def _refresh_dir(self, path: str, relative: str) -> int:
+        known = self.dirs.get(relative)
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            mtime_ns = None
+
+        if known and known[0] == mtime_ns:
+            return sum(self._refresh_dir(join(path, name), f"{relative}/{name}") for name in known[1])
+
+        # Changed, new or gone: forget everything below it and list it again
+        prefix = f"{relative}/"
+        for stale in [name for name in self.files if name.startswith(prefix)]:
+            del self.files[stale]
+        for stale in [name for name in self.dirs if name == relative or name.startswith(prefix)]:
+            del self.dirs[stale]
+        if mtime_ns is None:
+            return 0
+        self._scan_dir(path, relative)
+        return 1
+
+    def add(self, relative: str):
+        """Record a file that was added after the scan."""
+        stat = os.stat(join(self.root, relative))
+        self.files[relative] = (stat.st_size, stat.st_mtime_ns)
+
+    def count(self, folder: str) -> int:
+        prefix = f"{folder}/"
+        return sum(1 for relative in self.files if relative.startswith(prefix))
+
+    def __contains__(self, relative: str) -> bool:
+        return relative in self.files
+
+
+class PlanEntry:
+    """One catalog file and what a sync does with it."""
+    __slots__ = ('action', 'platform', 'machine_name', 'filetype', 'path', 'size', 'md5', 'source')
+
+    def __init__(self, action: str, platform: str, machine_name: str, filetype: str, path: str,
+                 size: int, md5: str, source: Optional[str] = None):
+        self.action = action
+        self.platform = platform
+        self.machine_name = machine_name
+        self.filetype = filetype
+        self.path = path  # Relative to the download path
+        self.size = size
+        self.md5 = md5
+        self.source = source  # Local file with the same content for dedupe entries
+
+    @property
+    def filename(self) -> str:
+        return f"{self.machine_name}.{self.filetype}"
+
+
+class DownloadPlan:
+    """Diff of the catalog against the local files, exportable as JSON and replayable later."""
+
+    def __init__(self, keys: List[str], entries: Optional[List[PlanEntry]] = None, created: Optional[float] = None):
+        self.keys = keys  # Orders the catalog was loaded from
+        self.entries = entries if entries is not None else []
+        self.created = created or time.time()
+
+    def pending(self) -> List[PlanEntry]:
+        """Entries that need work, everything but skip."""
+        return [entry for entry in self.entries if entry.action != 'skip']
+
+    def summary(self, platform: Optional[str] = None) -> Dict[str, Dict[str, int]]:
+        """Files and bytes per action, for one platform or all of them."""
+        totals = {action: {'files': 0, 'bytes': 0} for action in PLAN_ACTIONS}
+        for entry in self.entries:
+            if platform is None or entry.platform == platform:
+                totals[entry.action]['files'] += 1
+                totals[entry.action]['bytes'] += entry.size
+        return totals
+
+    def platforms(self) -> List[str]:
+        return sorted({entry.platform for entry in self.entries})
+
+    def write(self, filename: str):
+        """Write the plan as JSON, '-' prints it."""
+        plan = {'version': PLAN_VERSION, 'created': self.created, 'keys': self.keys, 'summary': self.summary(),
+                'entries': [{slot: getattr(entry, slot) for slot in PlanEntry.__slots__} for entry in self.entries]}
+        if filename == '-':
+            print(json.dumps(plan, indent=2))
+            return
+        with open(filename, 'w') as f:
+            json.dump(plan, f, indent=2)
+
+    @classmethod
+    def read(cls, filename: str) -> 'DownloadPlan':
+        with open(filename) as f:
+            plan = json.load(f)
+        if plan.get('version') != PLAN_VERSION:
+            raise ValueError(f"Unsupported plan version {plan.get('version')} in {filename}")
+        entries = [PlanEntry(**entry) for entry in plan['entries']]
+        return cls(plan['keys'], entries, plan.get('created'))
+
+
+class CatalogStore:
+    """Indexed on-disk catalog: the raw order API responses plus a queryable table of their downloads."""
+
+    SCHEMA_VERSION = 1
+
+    def __init__(self, db_path: str):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS orders (
+                gamekey TEXT PRIMARY KEY,
+                fetched_at REAL NOT NULL,
+                data TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS items (
+                id INTEGER PRIMARY KEY,
+                gamekey TEXT NOT NULL,
+                bundle TEXT NOT NULL,
+                bundle_name TEXT NOT NULL,
+                machine_name TEXT NOT NULL,
+                human_name TEXT NOT NULL,
+                platform TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS downloads (
+                item_id INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                web TEXT NOT NULL,
+                human_size TEXT NOT NULL,
+                file_size INTEGER NOT NULL,
+                md5 TEXT NOT NULL,
+                sha1 TEXT NOT NULL,
+                filetype TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS items_gamekey ON items (gamekey);
+            CREATE INDEX IF NOT EXISTS items_platform ON items (platform);
+            CREATE INDEX IF NOT EXISTS items_bundle ON items (bundle);
+            CREATE INDEX IF NOT EXISTS downloads_item ON downloads (item_id);
+            CREATE INDEX IF NOT EXISTS downloads_filetype ON downloads (filetype);
+        """)
+        # Orders cached by an older version have no rows in items/downloads yet
+        version = self._db.execute("PRAGMA user_version").fetchone()[0]
+        self.needs_reindex = version < self.SCHEMA_VERSION and not self.is_empty()
+        self._db.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+
+    def fresh_keys(self, keys: List[str], max_age: float) -> Set[str]:
+        """Return the keys among keys whose orders were fetched less than max_age seconds ago."""
+        oldest = time.time() - max_age
+        with self._lock:
+            cached = {gamekey for gamekey, in self._db.execute("SELECT gamekey FROM orders WHERE fetched_at >= ?",
+                                                                (oldest,))}
+        return cached.intersection(keys)
+
+    def all_keys(self) -> List[str]:
+        with self._lock:
+            return [gamekey for gamekey, in self._db.execute("SELECT gamekey FROM orders ORDER BY rowid")]
+
+    def iter_orders(self, batch_size: int = 100):
+        """Yield the raw orders one at a time, reading batch_size rows per query to keep memory flat.
+
+        Orders stored while iterating get a new rowid past the last one and are not yielded again.
+        """
+        with self._lock:
+            last_rowid, max_rowid = 0, self._db.execute("SELECT MAX(rowid) FROM orders").fetchone()[0] or 0
+        while True:
+            with self._lock:
+                rows = self._db.execute("SELECT rowid, data FROM orders WHERE rowid > ? AND rowid <= ? "
+                                        "ORDER BY rowid LIMIT ?", (last_rowid, max_rowid, batch_size)).fetchall()
+            if not rows:
+                return
+            last_rowid = rows[-1][0]
+            for _, data in rows:
+                yield json.loads(data)
+
+    def put(self, gamekey: str, order: Dict, bundle: 'Bundle', fetched_at: Optional[float] = None):
+        """Store a raw order together with its parsed bundle, replacing an earlier copy."""
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.execute("INSERT OR REPLACE INTO orders (gamekey, fetched_at, data) VALUES (?, ?, ?)",
+                                 (gamekey, fetched_at or time.time(), json.dumps(order)))
+                self._db.execute("DELETE FROM downloads WHERE item_id IN (SELECT id FROM items WHERE gamekey = ?)",
+                                 (gamekey,))
+                self._db.execute("DELETE FROM items WHERE gamekey = ?", (gamekey,))
+                for item in bundle.items:
+                    item_id = self._db.execute(
+                        "INSERT INTO items (gamekey, bundle, bundle_name, machine_name, human_name, platform) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (gamekey, bundle.bundle, bundle.name, item.machine_name, item.human_name, item.platform)
+                    ).lastrowid
+                    self._db.executemany(
+                        "INSERT INTO downloads (item_id, name, web, human_size, file_size, md5, sha1, filetype) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        [(item_id, dl.name, dl.web, dl.human_size, dl.file_size, dl.md5, dl.sha1, dl.filetype)
+                         for dl in item.download_struct])
+                self._db.execute("COMMIT")
+            except sqlite3.Error:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def load_catalog(self, keys: List[str], platforms: Optional[List[str]] = None,
+                     filetypes: Optional[List[str]] = None, bundle: Optional[str] = None) -> 'Catalog':
+        """Build a catalog of the given orders, only loading rows that match the filters."""
+        conditions, params = [], []
+        if platforms:
+            conditions.append(f"i.platform IN ({', '.join('?' * len(platforms))})")
+            params.extend(platforms)
+        if filetypes:
+            conditions.append(f"d.filetype IN ({', '.join('?' * len(filetypes))})")
+            params.extend(filetypes)
+        if bundle:
+            conditions.append("i.bundle = ?")
+            params.append(bundle)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        with self._lock:
+            self._db.execute("CREATE TEMP TABLE IF NOT EXISTS run_keys (gamekey TEXT PRIMARY KEY, pos INTEGER)")
+            self._db.execute("DELETE FROM temp.run_keys")
+            self._db.executemany("INSERT OR IGNORE INTO temp.run_keys (gamekey, pos) VALUES (?, ?)",
+                                 [(key, pos) for pos, key in enumerate(keys)])
+            rows = self._db.execute(f"""
+                SELECT i.id, i.gamekey, i.bundle, i.bundle_name, i.machine_name, i.human_name, i.platform,
+                       d.name, d.web, d.human_size, d.file_size, d.md5, d.sha1, d.filetype
+                FROM temp.run_keys k
+                JOIN items i ON i.gamekey = k.gamekey
+                JOIN downloads d ON d.item_id = i.id
+                {where}
+                ORDER BY k.pos, i.id, d.rowid""", params).fetchall()
+
+        catalog = Catalog()
+        current_bundle: Optional[Bundle] = None
+        current_item_id = None
+        item_row, download_struct = None, []
+
+        def flush_item():
+            if item_row:
+                current_bundle.items.append(CatalogItem(item_row[5], item_row[4], item_row[6], download_struct))
+
+        for row in rows:
+            if row[0] != current_item_id:
+                flush_item()
+                if current_bundle is None or current_bundle.gamekey != row[1]:
+                    if current_bundle is not None:
+                        catalog.add_bundle(current_bundle)
+                    current_bundle = Bundle(row[1], row[2], row[3])
+                current_item_id, item_row, download_struct = row[0], row, []
+            download_struct.append(DownloadEntry(*row[7:]))
+        flush_item()
+        if current_bundle is not None:
+            catalog.add_bundle(current_bundle)
+        return catalog
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM orders LIMIT 1").fetchone() is None
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class ChecksumCache:
+    """Persistent cache of file digests keyed by path, size, mtime and inode."""
+
+    def __init__(self, db_path: str):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS checksums (
+                                path TEXT PRIMARY KEY,
+                                size INTEGER NOT NULL,
+                                mtime_ns INTEGER NOT NULL,
+                                inode INTEGER NOT NULL,
+                                md5 TEXT,
+                                sha1 TEXT,
+                                sample TEXT)""")
+        # Caches written before sampled verification have no sample column yet
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(checksums)")}
+        if 'sample' not in columns:
+            self._db.execute("ALTER TABLE checksums ADD COLUMN sample TEXT")
+
+    @staticmethod
+    def _file_key(file_path: str) -> Tuple[str, int, int, int]:
+        stat = os.stat(file_path)
+        return os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+    def get(self, file_path: str, hash_type: str) -> Optional[str]:
+        """Return the cached digest if the file metadata is unchanged since it was hashed."""
+        path, size, mtime_ns, inode = self._file_key(file_path)
+        with self._lock:
+            row = self._db.execute(f"SELECT {hash_type} FROM checksums WHERE path = ? AND size = ? "
+                                   f"AND mtime_ns = ? AND inode = ?", (path, size, mtime_ns, inode)).fetchone()
+        return row[0] if row else None
+
+    def put(self, file_path: str, hashes: Dict[str, str]):
+        """Store digests for a file, dropping digests recorded for an older version of it."""
+        path, size, mtime_ns, inode = self._file_key(file_path)
+        with self._lock:
+            row = self._db.execute("SELECT md5, sha1, sample FROM checksums WHERE path = ? AND size = ? "
+                                   "AND mtime_ns = ? AND inode = ?", (path, size, mtime_ns, inode)).fetchone()
+            known = dict(zip(CACHED_DIGESTS, row)) if row else {}
+            known.update(hashes)
+            self._db.execute("INSERT OR REPLACE INTO checksums (path, size, mtime_ns, inode, md5, sha1, sample) "
+                             "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (path, size, mtime_ns, inode, known.get('md5'), known.get('sha1'), known.get('sample')))
+
+    def prune(self) -> int:
+        """Remove entries for files that are gone or changed, returns the number removed."""
+        stale = []
+        with self._lock:
+            rows = self._db.execute("SELECT path, size, mtime_ns, inode FROM checksums").fetchall()
+        for path, size, mtime_ns, inode in rows:
+            try:
+                if self._file_key(path) != (path, size, mtime_ns, inode):
+                    stale.append((path,))
+            except OSError:
+                stale.append((path,))
+        with self._lock:
+            self._db.executemany("DELETE FROM checksums WHERE path = ?", stale)
+        return len(stale)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class CountingHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose connection pools report opened versus reused connections."""
+
+    def __init__(self, transport: 'HttpTransport', **kwargs):
+        self.transport = transport
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        transport = self.transport
+
+        def counting(pool_cls):
+            class CountingPool(pool_cls):
+                def _get_conn(self, timeout=None):
+                    conn = super()._get_conn(timeout=timeout)
+                    # A connection with a live socket came out of the pool, otherwise one gets opened
+                    transport.record_connection(reused=getattr(conn, 'sock', None) is not None)
+                    return conn
+            return CountingPool
+
+        self.poolmanager.pool_classes_by_scheme = {
+            scheme: counting(pool_cls) for scheme, pool_cls in self.poolmanager.pool_classes_by_scheme.items()
+        }
+
+
+class HttpTransport:
+    """Persistent keep-alive session shared by all API calls and downloads."""
+
+    def __init__(self, pool_size: int, connect_timeout: float, read_timeout: float):
+        self.timeout = (connect_timeout, read_timeout)
+        self.connections_opened = 0
+        self.connections_reused = 0
+        self._lock = threading.Lock()
+
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        adapter = CountingHTTPAdapter(self, pool_connections=10, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """GET request through the shared session with the configured timeouts."""
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.get(url, **kwargs)
+
+    def record_connection(self, reused: bool):
+        with self._lock:
+            if reused:
+                self.connections_reused += 1
+            else:
+                self.connections_opened += 1
+
+    def close(self):
+        self.session.close()
+
+
+class ProgressDisplay:
+    """Combined single-line progress display for one or more concurrent downloads."""
+
+    def __init__(self, enabled: bool = True, width: int = 30, interval: float = 0.1):
+        self.enabled = enabled
+        self.width = width
+        self.interval = interval  # Minimum seconds between two redraws
+        self._lock = threading.Lock()
+        self._files: Dict[str, List[int]] = {}
+        self._last_render = 0.0
+
+    def start(self, name: str, total: int):
+        with self._lock:
+            self._files[name] = [0, total]
+        self._render(force=True)
+
+    def update(self, name: str, nbytes: int):
+        with self._lock:
+            if name in self._files:
+                self._files[name][0] += nbytes
+        self._render()
+
+    def finish(self, name: str):
+        with self._lock:
+            self._files.pop(name, None)
+            active = bool(self._files)
+        if self.enabled and not active:
+            sys.stdout.write('\n')
+            sys.stdout.flush()
+        elif active:
+            self._render(force=True)
+
+    def _render(self, force: bool = False):
+        if not self.enabled:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if not self._files or (not force and now - self._last_render < self.interval):
+                return
+            self._last_render = now
+            downloaded = sum(done for done, _ in self._files.values())
+            total = sum(size for _, size in self._files.values())
+            parts = []
+            for name, (done, size) in self._files.items():
+                percent = f"{100 * done // size}%" if size else f"{done / 1048576:.1f}MB"
+                parts.append(f"{os.path.basename(name)} {percent}")
+            done = int(self.width * downloaded / total) if total else 0
+            line = (f'\r[{"█" * done}{"." * (self.width - done)}] '
+                    f'{len(self._files)} file(s) {downloaded / 1048576:.1f}/{total / 1048576:.1f} MB | '
+                    + ' '.join(parts))
+            columns = shutil.get_terminal_size().columns
+            sys.stdout.write(line[:columns - 1].ljust(columns - 1))
+            sys.stdout.flush()
+
+
 class HumbleBundleDownloader:
     """Main downloader class with improved structure and error handling."""
 
     def __init__(self, args):
         self.args = args
         self.verbose = not args.quiet and (args.verbose or True)  # Default to verbose unless quiet
-        self.verify_checksum_on_existing_files = not args.no_checksum_on_local_files
+        self.verify_level = args.verify_level or ('none' if args.no_checksum_on_local_files else 'full')
+        if args.reverify and self.verify_level != 'none':
+            self.verify_level = 'full'  # Cached fingerprints are as trusted as cached checksums
+        self.verify_checksum_on_existing_files = self.verify_level != 'none'
         self.ignore_downloaded_checksum = args.ignore_downloaded_checksum
         self.dry_run = args.dry_run
+        self.reverify = args.reverify
+        self.verify_workers = max(1, args.verify_workers)
+        self.hash_block_size = max(32, args.hash_block_size) * 1024
+        self.use_mmap = args.mmap
+        self.workers = max(1, args.workers)
+        self.rate_limiter = RateLimiter(args.rate_limit)
+        self.order_cache_ttl = args.order_cache_ttl * 3600
+        self.batch_size = max(1, args.batch_size)
+
+        # Another base URL points every API call at a local stand-in, e.g. for testing
+        base_url = args.api_base_url.rstrip('/')
+        self.url_order = URL_ORDER.replace(API_BASE_URL, base_url)
+        self.url_orders = URL_ORDERS.replace(API_BASE_URL, base_url)
+        self.url_library = URL_LIBRARY.replace(API_BASE_URL, base_url)
+        self.jobs = max(1, args.jobs)
+        self.retries = max(0, args.retries)
+        self.retry_backoff = args.retry_backoff
+        self.failed_files: Dict[str, str] = {}  # filename -> last error, of the files that ran out of attempts
+        self._refresh_lock = threading.Lock()
+        self._refresh_locks: Dict[str, threading.Lock] = {}  # gamekey -> lock held while its order is refetched
+        self._refreshed_keys: Set[str] = set()  # Orders refetched for new download URLs during this sync
+        self.progress = ProgressDisplay(enabled=not args.quiet, interval=1 / max(args.progress_rate, 0.1))
+        self.chunk_size = max(16, args.chunk_size) * 1024
+        self.preallocate = args.preallocate
+        self._buffers = threading.local()
+        self.download_order = args.download_order
+        self.bandwidth = TokenBucket(args.bandwidth_limit or 0)
+        self.metrics = Metrics()
+        self._error_log = None
+        self._error_log_lock = threading.Lock()
+        self.stage_on_destination = args.stage_on_destination
+        self.dedupe = args.dedupe
+        self.watch_interval = args.watch
+        self.status_file = args.status_file
+        self.status: Dict = {'pid': os.getpid(), 'state': 'starting', 'syncs': 0, 'failed_syncs': 0}
+        self._wake = threading.Event()
+        self._stopping = False
+        self._stdout = sys.stdout  # JSON printed with '-' goes here even when messages go to stderr
+        self._interrupted = threading.Event()  # Set when a download pipeline is cut short, e.g. by Ctrl-C
+        self._cookie_mtime: Optional[int] = None
+        self._catalog_keys: Optional[List[str]] = None  # Keys the in-memory catalog was loaded for
+        self._scanned = False
+        self.content_index: Dict[str, Tuple[str, str]] = {}  # content key -> (relative path, machine name)
+        self.segments = max(1, args.segments)
+        self.segment_threshold = args.segment_threshold
+        self.transport = HttpTransport(pool_size=max(self.workers, self.jobs * self.segments),
+                                       connect_timeout=args.connect_timeout,
+                                       read_timeout=args.read_timeout)
 
         # Set allowed file types based on arguments
         self.allowed_filetypes = self._get_allowed_filetypes()
@@ -66,8 +978,7 @@ class HumbleBundleDownloader:
         self.md5_no_match_list: List[str] = []
 
         # Raw data storage
-        self.raw_platforms: List[str] = []
-        self.data: List[Dict] = []
+        self.catalog = Catalog()
 
     def _get_allowed_filetypes(self) -> List[str]:
         """Determine allowed file types based on command line arguments."""
@@ -105,8 +1016,18 @@ class HumbleBundleDownloader:
         if not self.path:
             self.path = str(Path().absolute())
 
-        self._assure_path_exists(self.download_temp_path)
         self._assure_path_exists(self.path)
+        if self.stage_on_destination:
+            # Staging next to the archive turns every finalize into a rename
+            self.download_temp_path = join(self.path, STAGING_DIR)
+        self._assure_path_exists(self.download_temp_path)
+
+        if self.verbose and os.stat(self.download_temp_path).st_dev != os.stat(self.path).st_dev:
+            self.colorize("Temp path is on another filesystem, finished files are copied in the background "
+                          "(--stage-on-destination avoids the copy)", "yellow")
+
+        self.checksum_cache = ChecksumCache(join(self.path, CHECKSUM_CACHE_FILE))
+        self.inventory = FileInventory(self.path)
 
     def colorize(self, text: str, color: str):
         """Print colored text if not in quiet mode."""
@@ -114,20 +1035,27 @@ class HumbleBundleDownloader:
             print(colored(text, color))
 
     def log_error(self, text: str):
-        """Log error to file with timestamp."""
+        """Log error to file with timestamp, the log stays open for the whole run."""
         now = datetime.now()
         logline = f"{now} message: {text}"
-        with open('errors.log', "a") as errorlog:
-            errorlog.write(logline + "\n")
+        self.metrics.add('errors')
+        with self._error_log_lock:
+            if self._error_log is None:
+                self._error_log = open('errors.log', "a", buffering=1)
+            self._error_log.write(logline + "\n")
 
     def _check_cookie(self):
-        """Load cookie from file."""
+        """Load cookie from file, unless it is unchanged since it was last loaded."""
         global COOKIE
         if not isfile('cookie.txt'):
             self.colorize(f"Directory Path: {Path().absolute()}", "red")
             self.colorize("Error: Could not read cookie.txt", "red")
             sys.exit(1)
 
+        mtime_ns = os.stat('cookie.txt').st_mtime_ns
+        if mtime_ns == self._cookie_mtime:
+            return
+        self._cookie_mtime = mtime_ns
         with open('cookie.txt', 'r') as cf:
             temp_cookie = cf.readline()
             COOKIE = json.loads(temp_cookie)
@@ -142,23 +1070,112 @@ class HumbleBundleDownloader:
         with open('settings.json') as json_file:
             return json.load(json_file)
 
-    def _api_call(self, key: str) -> Dict:
-        """Make API call to HumbleBundle."""
-        url = URL_ORDER + key + "?all_tpkds=true"
+    def _request(self, url: str, **kwargs) -> requests.Response:
+        """GET through the rate limiter, retrying connection errors, 429 and 5xx responses with backoff."""
+        for attempt in range(1, self.retries + 2):
+            self.rate_limiter.wait()
+            try:
+                response = self.transport.get(url, **kwargs)
+                response.raise_for_status()
+                return response
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+                if attempt > self.retries or not self._is_retryable(e):
+                    raise
+                delay = self._retry_delay(attempt, e)
+                self.metrics.add('api_retries')
+                if self.verbose:
+                    print(f"Request to {url.split('?')[0]} failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def _is_retryable(self, error: BaseException) -> bool:
+        """Client errors other than timeouts and rate limiting won't go away by trying again."""
+        response = getattr(error, 'response', None)
+        if isinstance(error, requests.HTTPError) and response is not None:
+            return response.status_code >= 500 or response.status_code in (408, 429)
+        return True
+
+    def _retry_delay(self, attempt: int, error: Optional[BaseException]) -> float:
+        """Exponential backoff with full jitter, but never sooner than the server's Retry-After."""
+        delay = random.uniform(0, min(RETRY_BACKOFF_CAP, self.retry_backoff * 2 ** (attempt - 1)))
+        retry_after = retry_after_seconds(getattr(error, 'response', None))
+        return max(delay, retry_after or 0.0)
+
+    def _api_call(self, key: str) -> Optional[Dict]:
+        """Make API call to HumbleBundle, returns None if the order could not be fetched."""
+        url = self.url_order + key + "?all_tpkds=true"
         try:
-            response = requests.get(url, headers=HEADERS, cookies=COOKIE)
-            response.raise_for_status()
-            return response.json()
-        except requests.RequestException as e:
+            return self._request(url, cookies=COOKIE).json()
+        except (requests.RequestException, ValueError) as e:
             self.colorize(f"Error fetching order {key}: {e}", 'red')
-            sys.exit(1)
+            self.log_error(f"Error fetching order {key}: {e}")
+            return None
+
+    def _api_call_batch(self, keys: List[str]) -> Dict[str, Optional[Dict]]:
+        """Fetch several orders per request, splitting the batch in halves when a request fails."""
+        if len(keys) == 1:
+            return {keys[0]: self._api_call(keys[0])}
+
+        try:
+            response = self._request(self.url_orders, cookies=COOKIE,
+                                     params=[('all_tpkds', 'true')] + [('gamekeys', key) for key in keys])
+            orders = response.json()
+            if not isinstance(orders, dict):
+                raise ValueError("Unexpected response format")
+        except (requests.RequestException, ValueError) as e:
+            self.log_error(f"Error fetching batch of {len(keys)} orders, splitting it: {e}")
+            self.metrics.add('order_batch_splits')
+            middle = len(keys) // 2
+            return {**self._api_call_batch(keys[:middle]), **self._api_call_batch(keys[middle:])}
+
+        # Keys left out of the response are retried one by one
+        results = {key: orders[key] for key in keys if orders.get(key)}
+        for key in keys:
+            if key not in results:
+                results[key] = self._api_call(key)
+        return results
+
+    def _fetch_orders(self, keys: List[str]) -> List[str]:
+        """Fetch order data for all keys in parallel batches into the catalog store, returns the failed keys."""
+        results: Dict[str, bool] = {}
+        completed = 0
+        lock = threading.Lock()
+
+        def fetch(batch: List[str]):
+            nonlocal completed
+            orders = self._api_call_batch(batch)
+            for key, order in orders.items():
+                if order is not None:
+                    try:
+                        with self.metrics.phase('parse'):
+                            bundle = self._parse_order(order)
+                        self.catalog_store.put(key, order, bundle)
+                    except (KeyError, TypeError, AttributeError, sqlite3.Error) as e:
+                        self.log_error(f"Could not store order {key}: {e}")
+                        orders[key] = None
+            with lock:
+                results.update({key: order is not None for key, order in orders.items()})
+                completed += len(batch)
+                if self.verbose:
+                    print(f"{batch[-1]}: {completed}/{len(keys)}")
+
+        batches = [keys[i:i + self.batch_size] for i in range(0, len(keys), self.batch_size)]
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(fetch, batch): batch for batch in batches}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    batch = futures[future]
+                    self.log_error(f"Could not fetch orders {batch[0]}..{batch[-1]}: {e}")
+                    with lock:
+                        completed += len(batch)
+
+        return [key for key in keys if not results.get(key)]
 
     def _get_library(self):
         """Get library page to extract keys."""
         try:
-            response = requests.get(URL_LIBRARY, headers=HEADERS, cookies=COOKIE)
-            response.raise_for_status()
-            return response
+            return self._request(self.url_library, cookies=COOKIE)
         except requests.RequestException as e:
             self.colorize(f"Error fetching library: {e}", 'red')
             sys.exit(1)
@@ -187,74 +1204,165 @@ class HumbleBundleDownloader:
             self.colorize(f"Error parsing library JSON: {e}", "red")
             return []
 
-    def _parse_json(self, raw_json: List[Dict]) -> List[Dict]:
-        """Parse raw JSON data into structured format."""
-        data = []
-        for res in raw_json:
-            bundle_data = {
-                'bundle': res['product']['machine_name'],
-                'name': res['product']['human_name'],
-                'nbr_subproducts_org': len(res['subproducts']),
-                'items': []
-            }
-
-            counter = 0
-            for item in res['subproducts']:
-                try:
-                    if 'downloads' not in item or not item['downloads']:
-                        continue
-
-                    platform = item['downloads'][0]['platform']
-                    self.raw_platforms.append(platform)
-
-                    single_item = {
-                        'human_name': item['human_name'],
-                        'machine_name': item['machine_name'],
-                        'platform': platform,
-                        'download_struct': []
-                    }
-
-                    for dl_str in item['downloads'][0].get('download_struct', []):
-                        tmp_dl_info = {
-                            'name': dl_str['name'],
-                            'web': dl_str['url']['web'],
-                            'human_size': dl_str['human_size'],
-                            'md5': dl_str['md5']
-                        }
+    def _import_data_json(self, filename: str):
+        """Import orders from a data.json export into the catalog store."""
+        with open(filename) as file:
+            raw_json = json.load(file)
+        fetched_at = os.path.getmtime(filename)
+        imported = 0
+        for order in raw_json:
+            if 'gamekey' in order:
+                self.catalog_store.put(order['gamekey'], order, self._parse_order(order), fetched_at)
+                imported += 1
+        self.colorize(f"Imported {imported} orders from {filename} into the catalog store.", "yellow")
+
+    def _export_data_json(self, filename: str):
+        """Write all stored orders to a data.json export, one order at a time."""
+        with open(filename, 'w') as f:
+            f.write('[')
+            for i, order in enumerate(self.catalog_store.iter_orders()):
+                if i:
+                    f.write(', ')
+                json.dump(order, f)
+            f.write(']')
+        self.colorize(f"Exported the catalog store to {filename}.", "yellow")
+
+    def _reindex_catalog_store(self):
+        """Rebuild the download tables for orders cached before they existed."""
+        for order in self.catalog_store.iter_orders():
+            self.catalog_store.put(order['gamekey'], order, self._parse_order(order))
+
+    def _parse_order(self, res: Dict) -> Bundle:
+        """Parse a raw order into a bundle holding the items that have downloads."""
+        bundle = Bundle(res.get('gamekey', ''), res['product']['machine_name'], res['product']['human_name'])
+
+        for item in res['subproducts']:
+            try:
+                if 'downloads' not in item or not item['downloads']:
+                    continue
 
-                        # SHA1 is optional
-                        if 'sha1' in dl_str:
-                            tmp_dl_info['sha1'] = dl_str['sha1']
+                platform = item['downloads'][0]['platform']
 
-                        single_item['download_struct'].append(tmp_dl_info)
+                download_struct = []
+                for dl_str in item['downloads'][0].get('download_struct', []):
+                    web = dl_str['url']['web']
+                    download_struct.append(DownloadEntry(
+                        name=dl_str['name'],
+                        web=web,
+                        human_size=dl_str['human_size'],
+                        file_size=dl_str.get('file_size', 0),
+                        md5=dl_str['md5'],
+                        sha1=dl_str.get('sha1', 'n/a'),  # SHA1 is optional
+                        filetype=self._get_filetype_from_url(web)
+                    ))
 
-                    bundle_data['items'].append(single_item)
-                    counter += 1
+                bundle.items.append(CatalogItem(item['human_name'], item['machine_name'],
+                                                platform, download_struct))
 
-                except (IndexError, KeyError):
-                    continue  # Skip items with no downloads
+            except (IndexError, KeyError):
+                continue  # Skip items with no downloads
 
-            bundle_data['nbr_subproducts'] = counter
-            data.append(bundle_data)
+        return bundle
 
-        return data
+    def _calculate_hash(self, file_path: str, hash_type: str = 'md5', use_cache: bool = False,
+                        fresh: bool = False) -> str:
+        """Calculate MD5 or SHA1 hash of a file, optionally through the checksum cache.
 
-    def _calculate_hash(self, file_path: str, hash_type: str = 'md5') -> str:
-        """Calculate MD5 or SHA1 hash of a file."""
-        block_size = 256 * 128
+        fresh reads the file even if the cache has a digest for it, the new digest is still cached.
+        """
+        block_size = self.hash_block_size
         hash_obj = hashlib.md5() if hash_type == 'md5' else hashlib.sha1()
 
         try:
+            if use_cache and not (self.reverify or fresh):
+                cached_hash = self.checksum_cache.get(file_path, hash_type)
+                if cached_hash:
+                    return cached_hash
+
             with open(file_path, 'rb') as f:
-                for chunk in iter(lambda: f.read(block_size), b''):
-                    hash_obj.update(chunk)
+                if self.use_mmap and os.fstat(f.fileno()).st_size:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                        view = memoryview(mapped)
+                        try:
+                            for offset in range(0, len(view), block_size):
+                                hash_obj.update(view[offset:offset + block_size])
+                        finally:
+                            view.release()
+                else:
+                    for chunk in iter(lambda: f.read(block_size), b''):
+                        hash_obj.update(chunk)
+                self.metrics.add('hashed_bytes', os.fstat(f.fileno()).st_size)
+
+            if use_cache:
+                self.checksum_cache.put(file_path, {hash_type: hash_obj.hexdigest()})
             return hash_obj.hexdigest()
-        except OSError as e:
+        except (OSError, sqlite3.Error) as e:
             self.log_error(f"Hash calculation failed for {file_path}: {e}")
             raise
 
-    def _verify_checksum(self, filepath: str, filename: str, expected_hash: str, hash_type: str = 'md5') -> Dict:
-        """Verify file checksum."""
+    def _sample_fingerprint(self, file_path: str) -> str:
+        """MD5 over the size and evenly spaced sample blocks of a file."""
+        hash_obj = hashlib.md5()
+        with open(file_path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            hash_obj.update(str(size).encode())
+            if size <= SAMPLE_BLOCKS * SAMPLE_BLOCK_SIZE:
+                hash_obj.update(f.read())  # Small files are read whole
+                self.metrics.add('sampled_bytes', size)
+                return hash_obj.hexdigest()
+
+            step = (size - SAMPLE_BLOCK_SIZE) / (SAMPLE_BLOCKS - 1)
+            for i in range(SAMPLE_BLOCKS):
+                f.seek(int(i * step))
+                hash_obj.update(f.read(SAMPLE_BLOCK_SIZE))
+        self.metrics.add('sampled_bytes', SAMPLE_BLOCKS * SAMPLE_BLOCK_SIZE)
+        return hash_obj.hexdigest()
+
+    def _verify_local_file(self, relative_path: str, md5_hash: str, expected_size: int) -> bool:
+        """Check an existing file at the configured verify level, escalating to a full hash on any doubt.
+
+        size compares the file against the catalog's byte size, sample also reads a few blocks and compares
+        them with the fingerprint taken when this version of the file was last fully verified. Files without
+        an exact catalog size get the sampled check at the size level too.
+        """
+        file_path = join(self.path, relative_path)
+        if self.verify_level in ('size', 'sample'):
+            size = os.path.getsize(file_path)
+            if expected_size and size != expected_size:
+                return self._escalate_verification(relative_path, md5_hash, f"{size} bytes instead of {expected_size}")
+            if self.verify_level == 'size' and expected_size:
+                self.metrics.add('verified_by_size')
+                return True
+
+            # Sampled check, also for the size level when the catalog has no exact size to compare with
+            known = self.checksum_cache.get(file_path, 'sample')
+            if not known:  # Never fully verified, or changed since. A cached MD5 of this version still counts
+                return self._escalate_verification(relative_path, md5_hash, "no fingerprint of this version",
+                                                   fresh=False)
+            if self._sample_fingerprint(file_path) != known:
+                return self._escalate_verification(relative_path, md5_hash, "sampled blocks changed")
+            self.metrics.add('verified_by_sample')
+            return True
+
+        return self._verify_full(relative_path, md5_hash)
+
+    def _escalate_verification(self, relative_path: str, md5_hash: str, reason: str, fresh: bool = True) -> bool:
+        self.metrics.add('verify_escalations')
+        if self.verbose:
+            self.colorize(f"{relative_path}: {reason}, checking the full hash", "yellow")
+        return self._verify_full(relative_path, md5_hash, fresh)
+
+    def _verify_full(self, relative_path: str, md5_hash: str, fresh: bool = False) -> bool:
+        """Full MD5 check, a file that passes gets a sample fingerprint for later sampled checks."""
+        verdict = self._verify_checksum(self.path, relative_path, md5_hash, use_cache=True, fresh=fresh)['verdict']
+        file_path = join(self.path, relative_path)
+        if verdict and (fresh or not self.checksum_cache.get(file_path, 'sample')):
+            self.checksum_cache.put(file_path, {'sample': self._sample_fingerprint(file_path)})
+        return verdict
+
+    def _verify_checksum(self, filepath: str, filename: str, expected_hash: str, hash_type: str = 'md5',
+                         calculated_hash: Optional[str] = None, use_cache: bool = False, fresh: bool = False) -> Dict:
+        """Verify file checksum, reading the file only when no calculated hash is given."""
         file_path = join(filepath, filename)
 
         if self.verbose:
@@ -264,7 +1372,8 @@ class HumbleBundleDownloader:
             return {"verdict": True, "checksum_org": expected_hash, "checksum_calc": "skipped"}
 
         try:
-            calculated_hash = self._calculate_hash(file_path, hash_type)
+            if calculated_hash is None:
+                calculated_hash = self._calculate_hash(file_path, hash_type, use_cache, fresh)
 
             if expected_hash == calculated_hash:
                 if self.verbose:
@@ -274,60 +1383,34 @@ class HumbleBundleDownloader:
                 self.colorize(f"{hash_type.upper()} verification failed!", "red")
                 return {"verdict": False, "checksum_org": expected_hash, "checksum_calc": calculated_hash}
 
-        except OSError as e:
+        except (OSError, sqlite3.Error) as e:
             raise OSError(f'{hash_type.upper()} check failure: {e}')
 
-    def _get_item_object(self, machine_name: str) -> Optional[Dict]:
+    def _get_item_object(self, machine_name: str) -> Optional[CatalogItem]:
         """Find item object by machine name."""
-        for bundle in self.data:
-            for item in bundle['items']:
-                if item.get('machine_name', '').lower() == machine_name.lower():
-                    return item
-        return None
+        return self.catalog.get(machine_name)
 
-    def _get_url(self, item: Dict, filetype: str) -> str:
+    def _get_url(self, item: CatalogItem, filetype: str) -> str:
         """Get download URL for specific filetype."""
-        # First try exact match
-        for dl_str in item['download_struct']:
-            if dl_str['name'].lower() == filetype.lower():
-                return dl_str['web'] if "FILE_NAME" not in dl_str['web'] else "n/a"
-
-        # Try URL-based matching
-        for dl_str in item['download_struct']:
-            url = dl_str['web']
-            url_filetype = self._get_filetype_from_url(url)
-            if url_filetype == filetype.lower():
-                return url if "FILE_NAME" not in url else "n/a"
-
-        # Try weird names
-        weird_names = {'download', 'supplement', 'mp3', 'companion file', 'installer', '.zip'}
-        for dl_str in item['download_struct']:
-            if dl_str['name'].lower() in weird_names:
-                return dl_str['web'] if "FILE_NAME" not in dl_str['web'] else "n/a"
-
-        self.colorize(f"Could not get URL from {item['human_name']} with {filetype} extension", "red")
-        self.log_error(f"Could not get URL from {item['human_name']} with {filetype} extension")
+        dl = item.lookup(filetype)
+        if dl:
+            return dl.web if "FILE_NAME" not in dl.web else "n/a"
+
+        self.colorize(f"Could not get URL from {item.human_name} with {filetype} extension", "red")
+        self.log_error(f"Could not get URL from {item.human_name} with {filetype} extension")
         return "n/a"
 
-    def _get_hash(self, item: Dict, filetype: str, hash_type: str = 'md5') -> str:
+    def _get_hash(self, item: CatalogItem, filetype: str, hash_type: str = 'md5') -> str:
         """Get hash for specific filetype."""
-        dl_dict = {dl['name'].lower(): dl for dl in item['download_struct']}
-
-        # Check for exact match
-        if filetype.lower() in dl_dict:
-            return dl_dict[filetype.lower()].get(hash_type, 'n/a')
-
-        # Check weird names
-        weird_names = {'download', 'supplement', 'mp3', 'companion file', 'installer', '.zip'}
-        for weird_name in weird_names:
-            if weird_name in dl_dict:
-                return dl_dict[weird_name].get(hash_type, 'n/a')
+        dl = item.lookup(filetype)
+        if dl:
+            return getattr(dl, hash_type, 'n/a')
 
         # Return first available if any
-        if dl_dict:
-            first_item = next(iter(dl_dict.values()))
-            self.log_error(f"New weird name detected: {first_item['name']}")
-            return first_item.get(hash_type, 'n/a')
+        if item.download_struct:
+            first_item = item.download_struct[0]
+            self.log_error(f"New weird name detected: {first_item.name}")
+            return getattr(first_item, hash_type, 'n/a')
 
         return 'n/a'
 
@@ -352,34 +1435,289 @@ class HumbleBundleDownloader:
             print(f"Skipping {filename} - not in allowed filetypes")
         return False
 
-    def _progress_download(self, url: str, filename: str):
-        """Download file with progress bar."""
-        if self.dry_run:
-            print(f"[DRY RUN] Would download: {filename}")
-            return
+    def _load_partial_download(self, part_filename: str, sidecar_filename: str, url: str,
+                               expected_size: int, expected_md5: str) -> Tuple[int, Dict]:
+        """Return the resume offset and sidecar for a partial download, or 0 if it can't be resumed."""
+        if isfile(part_filename) and isfile(sidecar_filename):
+            try:
+                with open(sidecar_filename) as f:
+                    sidecar = json.load(f)
+            except (OSError, ValueError):
+                sidecar = {}
+
+            # Signed URLs change their query string between fetches, the file itself must not
+            if (sidecar.get('url', '').split('?')[0] == url.split('?')[0]
+                    and sidecar.get('size') == expected_size
+                    and sidecar.get('md5') == expected_md5):
+                # A preallocated part file is full size from the start, the sidecar knows how much is written
+                part_size = os.path.getsize(part_filename)
+                return min(sidecar.get('written', part_size), part_size), sidecar
+
+        for stale in (part_filename, sidecar_filename):
+            if isfile(stale):
+                os.remove(stale)
+        return 0, {}
+
+    def _hash_existing_part(self, part_filename: str, hashers: Dict, length: int):
+        """Feed the already downloaded part of a resumed file into the hashers."""
+        with open(part_filename, 'rb') as f:
+            remaining = length
+            while remaining:
+                chunk = f.read(min(remaining, 1024 * 1024))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                for hash_obj in hashers.values():
+                    hash_obj.update(chunk)
 
-        with open(filename, 'wb') as f:
-            response = requests.get(url, stream=True)
-            total = response.headers.get('content-length')
+    def _get_download_buffer(self) -> memoryview:
+        """Reusable per thread buffer that downloads are read into."""
+        buffer = getattr(self._buffers, 'buffer', None)
+        if buffer is None:
+            buffer = self._buffers.buffer = bytearray(self.chunk_size)
+        return memoryview(buffer)
 
-            if total is None:
-                f.write(response.content)
+    def _preallocate(self, f, size: int):
+        """Reserve the full file size up front to avoid fragmentation, where the filesystem supports it."""
+        try:
+            if hasattr(os, 'posix_fallocate'):
+                os.posix_fallocate(f.fileno(), 0, size)
             else:
-                downloaded = 0
-                total = int(total)
-                for data in response.iter_content(chunk_size=max(int(total / 1000), 1024 * 1024)):
-                    downloaded += len(data)
-                    f.write(data)
-                    done = int(50 * downloaded / total)
-                    if not self.args.quiet:
-                        sys.stdout.write(f'\r[{"█" * done}{"." * (50 - done)}]')
-                        sys.stdout.flush()
+                f.truncate(size)
+        except OSError as e:
+            self.log_error(f"Could not preallocate {size} bytes for {f.name}: {e}")
 
-        if not self.args.quiet:
-            sys.stdout.write('\n')
+    def _write_sidecar(self, sidecar_filename: str, sidecar: Dict):
+        with open(sidecar_filename, 'w') as f:
+            json.dump(sidecar, f)
+
+    def _split_segments(self, size: int) -> List[List[int]]:
+        """Split a file into [start, position, end) byte ranges, one per segment."""
+        step = -(-size // self.segments)
+        return [[start, start, min(start + step, size)] for start in range(0, size, step)]
+
+    def _request_segment(self, url: str, segment: List[int], validator: Optional[str]) -> Optional[requests.Response]:
+        """Request the outstanding bytes of a segment, or return None if the server ignores the range."""
+        headers = {'Accept-Encoding': 'identity', 'Range': f"bytes={segment[1]}-{segment[2] - 1}"}
+        if validator:
+            headers['If-Range'] = validator
+
+        response = self.transport.get(url, stream=True, headers=headers)
+        if response.status_code == 206 and response.headers.get('content-range', '').startswith(f"bytes {segment[1]}-"):
+            return response
+        response.close()
+        response.raise_for_status()
+        return None
+
+    def _segmented_download(self, url: str, filename: str, expected_size: int,
+                            expected_md5: str) -> Optional[Dict[str, str]]:
+        """Download a file as parallel byte range segments written at their offsets into one .part file.
+
+        Returns None if the server doesn't honour range requests, the caller then downloads a single stream.
+        """
+        part_filename = filename + '.part'
+        sidecar_filename = part_filename + '.json'
+        offset, sidecar = self._load_partial_download(part_filename, sidecar_filename, url,
+                                                      expected_size, expected_md5)
+        if offset and not sidecar.get('segments'):
+            return None  # Continue the earlier single stream download instead
+
+        segments = sidecar.get('segments') or self._split_segments(expected_size)
+        pending = [segment for segment in segments if segment[1] < segment[2]]
+        validator = sidecar.get('etag') or sidecar.get('last_modified')
+
+        # The first request doubles as the check whether the server supports ranges at all
+        probe = self._request_segment(url, pending[0], validator) if pending else None
+        if pending and probe is None:
+            if self.verbose:
+                print(f"Server doesn't support range requests, downloading {filename} as a single stream")
+            return None
+
+        if not offset:
+            sidecar = {'url': url, 'size': expected_size, 'md5': expected_md5,
+                       'etag': probe.headers.get('etag'),
+                       'last_modified': probe.headers.get('last-modified'),
+                       'segments': segments}
+            validator = sidecar['etag'] or sidecar['last_modified']
+            with open(part_filename, 'wb') as f:
+                self._preallocate(f, expected_size)
+            self._write_sidecar(sidecar_filename, sidecar)
+        elif self.verbose:
+            print(f"Resuming segmented download of {filename}")
+
+        sidecar_lock = threading.Lock()
+
+        def save_sidecar():
+            with sidecar_lock:
+                self._write_sidecar(sidecar_filename, sidecar)
+
+        def fetch(segment: List[int], response: Optional[requests.Response]) -> int:
+            if response is None:
+                response = self._request_segment(url, segment, validator)
+                if response is None:
+                    raise IOError(f"Server stopped honouring range requests for {filename}")
+
+            transferred = 0
+            saved = segment[1]
+            try:
+                with response, open(part_filename, 'r+b') as f:
+                    f.seek(segment[1])
+                    raw = response.raw
+                    raw.decode_content = True
+                    view = self._get_download_buffer()
+                    while segment[1] < segment[2]:
+                        nbytes = raw.readinto(view[:segment[2] - segment[1]])
+                        if not nbytes:
+                            raise IOError(f"Incomplete segment, stopped at byte {segment[1]} of {segment[2]}")
+                        if self._interrupted.is_set():
+                            raise IOError("Download interrupted")
+                        self.bandwidth.consume(nbytes)
+                        f.write(view[:nbytes])
+                        transferred += nbytes
+                        segment[1] += nbytes
+                        self.progress.update(filename, nbytes)
+
+                        if segment[1] - saved >= SIDECAR_SAVE_INTERVAL:
+                            saved = segment[1]
+                            save_sidecar()
+            finally:
+                self.metrics.add('bytes_downloaded', transferred)
+                save_sidecar()
+            return transferred
+
+        started = time.perf_counter()
+        self.progress.start(filename, expected_size)
+        self.progress.update(filename, sum(position - start for start, position, _ in segments))
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, len(pending))) as executor:
+                futures = [executor.submit(fetch, segment, probe if i == 0 else None)
+                           for i, segment in enumerate(pending)]
+                transferred = sum(future.result() for future in futures)
+        finally:
+            self.progress.finish(filename)
+
+        self.metrics.add('segmented_downloads')
+        self.metrics.record_file(os.path.basename(filename), transferred, time.perf_counter() - started)
+
+        # Segments arrive out of order, so the digests are calculated once the file is complete
+        hashers = {hash_type: hashlib.new(hash_type) for hash_type in HASH_ALGORITHMS}
+        self._hash_existing_part(part_filename, hashers, expected_size)
+        os.replace(part_filename, filename)
+        os.remove(sidecar_filename)
+        return {hash_type: hash_obj.hexdigest() for hash_type, hash_obj in hashers.items()}
+
+    def _progress_download(self, url: str, filename: str, expected_size: int = 0,
+                           expected_md5: str = "n/a") -> Optional[Dict[str, str]]:
+        """Download file to a .part file, resuming an earlier partial download when possible.
+
+        The body is streamed through a fixed size buffer, so memory use doesn't grow with the file.
+        Returns the digests of HASH_ALGORITHMS calculated from the downloaded data.
+        """
+        if self.segments > 1 and expected_size >= self.segment_threshold:
+            hashes = self._segmented_download(url, filename, expected_size, expected_md5)
+            if hashes is not None:
+                return hashes
+
+        hashers = {hash_type: hashlib.new(hash_type) for hash_type in HASH_ALGORITHMS}
+
+        part_filename = filename + '.part'
+        sidecar_filename = part_filename + '.json'
+        offset, sidecar = self._load_partial_download(part_filename, sidecar_filename, url,
+                                                      expected_size, expected_md5)
+        if sidecar.get('segments'):
+            offset = 0  # A segmented part file has gaps, it can only be restarted as a single stream
+
+        headers = {'Accept-Encoding': 'identity'}
+        if offset:
+            headers['Range'] = f"bytes={offset}-"
+            validator = sidecar.get('etag') or sidecar.get('last_modified')
+            if validator:
+                headers['If-Range'] = validator
+
+        started = time.perf_counter()
+        transferred = 0
+
+        with self.transport.get(url, stream=True, headers=headers) as response:
+            if offset and response.status_code == 416 and offset == expected_size:
+                # Everything was already downloaded before the interruption
+                self._hash_existing_part(part_filename, hashers, offset)
+                os.replace(part_filename, filename)
+                os.remove(sidecar_filename)
+                return {hash_type: hash_obj.hexdigest() for hash_type, hash_obj in hashers.items()}
+            response.raise_for_status()
+
+            content_range = response.headers.get('content-range', '')
+            if offset and (response.status_code != 206 or not content_range.startswith(f"bytes {offset}-")):
+                if self.verbose:
+                    print(f"Server ignored resume request, restarting download of {filename}")
+                offset = 0
+
+            total = response.headers.get('content-length')
+            total = int(total) + offset if total is not None else 0
+
+            if offset:
+                if self.verbose:
+                    print(f"Resuming download of {filename} at byte {offset}")
+                self._hash_existing_part(part_filename, hashers, offset)
+            else:
+                sidecar = {'url': url, 'size': expected_size, 'md5': expected_md5,
+                           'etag': response.headers.get('etag'),
+                           'last_modified': response.headers.get('last-modified')}
+
+            with open(part_filename, 'r+b' if offset else 'wb') as f:
+                if offset:
+                    f.seek(offset)
+                elif self.preallocate and (total or expected_size):
+                    self._preallocate(f, total or expected_size)
+                sidecar['written'] = offset
+                self._write_sidecar(sidecar_filename, sidecar)
+
+                raw = response.raw
+                raw.decode_content = True
+                view = self._get_download_buffer()
+                saved = 0
+
+                self.progress.start(filename, total)
+                self.progress.update(filename, offset)
+                try:
+                    while True:
+                        nbytes = raw.readinto(view)
+                        if not nbytes:
+                            break
+                        if self._interrupted.is_set():
+                            raise IOError("Download interrupted")
+                        chunk = view[:nbytes]
+                        self.bandwidth.consume(nbytes)
+                        f.write(chunk)
+                        for hash_obj in hashers.values():
+                            hash_obj.update(chunk)
+                        transferred += nbytes
+                        self.progress.update(filename, nbytes)
+
+                        # Keep the resume point current in case the process gets killed
+                        if transferred - saved >= SIDECAR_SAVE_INTERVAL:
+                            saved = transferred
+                            sidecar['written'] = offset + transferred
+                            self._write_sidecar(sidecar_filename, sidecar)
+                    f.truncate()
+                finally:
+                    self.progress.finish(filename)
+                    self.metrics.add('bytes_downloaded', transferred)
+                    sidecar['written'] = offset + transferred
+                    self._write_sidecar(sidecar_filename, sidecar)
+
+        self.metrics.record_file(os.path.basename(filename), transferred, time.perf_counter() - started)
+
+        downloaded = offset + transferred
+        if expected_size and downloaded != expected_size:
+            raise IOError(f"Incomplete download, got {downloaded} of {expected_size} bytes")
+
+        os.replace(part_filename, filename)
+        os.remove(sidecar_filename)
+        return {hash_type: hash_obj.hexdigest() for hash_type, hash_obj in hashers.items()}
 
     def _download(self, machine_name: str, filetype: str) -> Optional[Dict]:
-        """Download a single file."""
+        """Download a single file, None if the catalog has no download for it. Download errors are raised."""
         file_item = self._get_item_object(machine_name)
         if not file_item:
             return None
@@ -389,35 +1727,78 @@ class HumbleBundleDownloader:
             return None
 
         url_file_type = self._get_filetype_from_url(url)
-        temp_filename = os.path.join(self.download_temp_path, machine_name)
+        # One temp file per format, so pdf and epub of the same item can download side by side
+        temp_name = f"{machine_name}.{url_file_type}"
+        temp_filename = os.path.join(self.download_temp_path, temp_name)
 
         if self.verbose:
             human_size = self._get_human_size(file_item, url_file_type)
-            print(f"Starting download for: {file_item['human_name']}.{url_file_type} with size: {human_size}")
+            print(f"Starting download for: {file_item.human_name}.{url_file_type} with size: {human_size}")
             print(f"Downloading file: {machine_name} to path: {self.download_temp_path}")
             print(f"URL for download: {url}")
 
+        dl = file_item.lookup(filetype)
+
         try:
-            self._progress_download(url, temp_filename)
+            with self.metrics.phase('download'):
+                try:
+                    hashes = self._progress_download(url, temp_filename, dl.file_size, dl.md5)
+                except requests.HTTPError as e:
+                    # Signed URLs expire, a fresh copy of the owning order has new ones
+                    expired = e.response is not None and e.response.status_code in (403, 410)
+                    if not expired or not self._refresh_download_urls(machine_name):
+                        raise
+                    url = self._get_url(file_item, filetype)
+                    if self.verbose:
+                        print(f"Retrying {machine_name} with a refreshed URL")
+                    hashes = self._progress_download(url, temp_filename, dl.file_size, dl.md5)
+            self.metrics.add('files_downloaded')
             return {
+                'hashes': hashes or {},
                 'path': self.download_temp_path,
+                'temp_name': temp_name,
                 'machine_name': machine_name,
                 'filetype': url_file_type,
-                'platform': file_item['platform']
+                'platform': file_item.platform,
+                'content_key': self._content_key(dl)
             }
         except Exception as e:
             error_msg = f"Failure to download file! filetype:{url_file_type} filename: {machine_name} path: {self.download_temp_path} error: {str(e)}"
             self.log_error(error_msg)
             if self.verbose:
                 print(f"Download failure: {e}")
-            return None
+            raise
+
+    def _refresh_download_urls(self, machine_name: str) -> bool:
+        """Refetch the order an item belongs to and patch its download URLs into catalog and store.
+
+        Each order is refetched at most once per sync, concurrent downloads of the same order wait for it.
+        """
+        gamekey = self.catalog.owner(machine_name)
+        if not gamekey:
+            return False
+        with self._refresh_lock:
+            order_lock = self._refresh_locks.setdefault(gamekey, threading.Lock())
 
-    def _get_human_size(self, item: Dict, filetype: str) -> str:
+        with order_lock:
+            if gamekey in self._refreshed_keys:
+                return True
+            if self.verbose:
+                self.colorize(f"Download link of {machine_name} expired, refreshing order {gamekey}", "yellow")
+            order = self._api_call(gamekey)
+            if not order:
+                return False
+            bundle = self._parse_order(order)
+            self.catalog_store.put(gamekey, order, bundle)
+            self.metrics.add('orders_refreshed')
+            self.metrics.add('urls_refreshed', self.catalog.patch_urls(bundle))
+            self._refreshed_keys.add(gamekey)
+        return True
+
+    def _get_human_size(self, item: CatalogItem, filetype: str) -> str:
         """Get human readable file size."""
-        for dl_str in item['download_struct']:
-            if dl_str['name'].lower() == filetype.lower():
-                return dl_str['human_size']
-        return '0'
+        dl = item.lookup(filetype)
+        return dl.human_size if dl else '0'
 
     def _checksum_file(self, file_info: Dict) -> bool:
         """Verify checksums for downloaded file."""
@@ -431,11 +1812,16 @@ class HumbleBundleDownloader:
         if not file_item:
             return False
 
+        # Digests calculated during the download spare reading the file again
+        hashes = file_info.get('hashes', {})
+
         md5_hash = self._get_hash(file_item, filetype, 'md5')
-        md5_result = self._verify_checksum(file_info['path'], machine_name, md5_hash, 'md5')
+        md5_result = self._verify_checksum(file_info['path'], file_info['temp_name'], md5_hash, 'md5',
+                                           hashes.get('md5'))
 
         sha1_hash = self._get_hash(file_item, filetype, 'sha1')
-        sha1_result = self._verify_checksum(file_info['path'], machine_name, sha1_hash, 'sha1')
+        sha1_result = self._verify_checksum(file_info['path'], file_info['temp_name'], sha1_hash, 'sha1',
+                                            hashes.get('sha1'))
 
         # If both pass, return True
         if md5_result['verdict'] and sha1_result['verdict']:
@@ -458,196 +1844,698 @@ class HumbleBundleDownloader:
 
     def _move_file(self, file_info: Dict):
         """Move file from temp to final location."""
-        if self.dry_run:
-            print(f"[DRY RUN] Would move file to final location")
-            return
-
-        platform = file_info['platform'].lower()
-        filetype = file_info['filetype'].lower()
-        filename = f"{file_info['machine_name']}.{filetype}"
-
-        tempfile = join(self.download_temp_path, file_info['machine_name'])
-
-        if platform == "ebook":
-            path = join(self.path, f"ebook/{filetype}")
-        else:
-            path = join(self.path, platform)
+        relative_path = self._get_relative_path(file_info['platform'], file_info['machine_name'],
+                                                file_info['filetype'])
+        tempfile = join(self.download_temp_path, file_info['temp_name'])
 
-        finalpath = join(path, filename)
+        finalpath = join(self.path, relative_path)
+        path = os.path.dirname(finalpath)
         self._assure_path_exists(path)
 
         if self.verbose:
             self.colorize(f"Moving {tempfile} to {finalpath}", "blue")
 
-        shutil.move(tempfile, finalpath)
+        self._finalize_file(tempfile, finalpath, relative_path, file_info)
+
+    def _finalize_file(self, tempfile: str, finalpath: str, relative_path: str, file_info: Dict):
+        """Put a verified file in place. It only appears under its final name once it is complete."""
+        with self.metrics.phase('move'):
+            if os.stat(tempfile).st_dev == os.stat(os.path.dirname(finalpath)).st_dev:
+                os.replace(tempfile, finalpath)
+            else:
+                # Copy next to the target under a name the platform scan doesn't match, then rename
+                staging = join(os.path.dirname(finalpath), f".{os.path.basename(finalpath)}.moving")
+                try:
+                    self._copy_file(tempfile, staging)
+                    os.replace(staging, finalpath)
+                except BaseException:
+                    if isfile(staging):
+                        os.remove(staging)
+                    raise
+                os.remove(tempfile)
+                self.metrics.add('cross_device_bytes', os.path.getsize(finalpath))
+        self.inventory.add(relative_path)
+        if self.dedupe and file_info.get('content_key'):
+            self.content_index[file_info['content_key']] = (relative_path, file_info['machine_name'])
+
+        # Remember the streamed digests so the next run doesn't have to hash the file again
+        if file_info.get('hashes'):
+            try:
+                fingerprint = self._sample_fingerprint(finalpath)
+                self.checksum_cache.put(finalpath, dict(file_info['hashes'], sample=fingerprint))
+            except (OSError, sqlite3.Error) as e:
+                self.log_error(f"Could not cache checksums for {finalpath}: {e}")
+
+    def _copy_file(self, source: str, target: str):
+        """Copy a file inside the kernel where possible, falling back to a buffered copy."""
+        with open(source, 'rb') as fsrc, open(target, 'wb') as fdst:
+            infd, outfd = fsrc.fileno(), fdst.fileno()
+            size = os.fstat(infd).st_size
+            copied = 0
+
+            # copy_file_range can reflink or copy server side, e.g. on NFS 4.2 and SMB
+            if hasattr(os, 'copy_file_range'):
+                try:
+                    while copied < size:
+                        nbytes = os.copy_file_range(infd, outfd, size - copied, copied, copied)
+                        if not nbytes:
+                            break
+                        copied += nbytes
+                except OSError:
+                    pass  # Not supported between these filesystems
+
+            if copied < size and hasattr(os, 'sendfile'):
+                try:
+                    os.lseek(outfd, copied, os.SEEK_SET)
+                    while copied < size:
+                        nbytes = os.sendfile(outfd, infd, copied, size - copied)
+                        if not nbytes:
+                            break
+                        copied += nbytes
+                except OSError:
+                    pass
+
+            if copied < size:
+                fsrc.seek(copied)
+                fdst.seek(copied)
+                shutil.copyfileobj(fsrc, fdst, self.chunk_size)
+                fdst.flush()
+            os.fsync(outfd)
+
+    def _content_key(self, dl: Optional[DownloadEntry]) -> Optional[str]:
+        """Identity of a download's content, taken from the catalog digests."""
+        if dl is None:
+            return None
+        for digest in (dl.md5, dl.sha1):
+            if digest and digest != 'n/a':
+                return digest
+        return None
+
+    def _build_content_index(self):
+        """Index the catalog files that are on disk by their content key."""
+        self.content_index = {}
+        for item in self.catalog.items.values():
+            for dl in item.download_struct:
+                key = self._content_key(dl)
+                if not key or not dl.filetype:
+                    continue
+                relative_path = self._get_relative_path(item.platform, item.machine_name, dl.filetype)
+                stat = self.inventory.files.get(relative_path)
+                if stat and (not dl.file_size or stat[0] == dl.file_size):
+                    self.content_index.setdefault(key, (relative_path, item.machine_name))
+
+    def _forget_failed_content(self, machine_names: List[str]):
+        """Stop using local files that failed verification as a source for duplicates."""
+        failed = set(machine_names)
+        for key, (_, machine_name) in list(self.content_index.items()):
+            if machine_name in failed:
+                del self.content_index[key]
+
+    def _get_download_entry(self, filename: str) -> Tuple[Optional[CatalogItem], Optional[DownloadEntry]]:
+        item = self._get_item_object(filename[:filename.rfind('.')])
+        if not item:
+            return None, None
+        return item, item.lookup(filename[filename.rfind('.') + 1:])
+
+    def _deduplicate(self, missing_files: List[str]) -> Dict[str, List[str]]:
+        """Link missing files whose content is already on disk and hold back repeats within the list.
+
+        Returns the held back files by content key, they are linked once their first copy is downloaded.
+        Files that are on disk already failed verification, they are always downloaded again.
+        """
+        followers: Dict[str, List[str]] = {}
+        remaining = []
+        for filename in missing_files:
+            item, dl = self._get_download_entry(filename)
+            key = self._content_key(dl)
+            if key is None or self._get_relative_path(item.platform, item.machine_name, dl.filetype) in self.inventory:
+                remaining.append(filename)
+            elif key in self.content_index and self._link_duplicate(key, item, dl):
+                continue
+            elif key in followers:
+                followers[key].append(filename)
+            else:
+                followers[key] = []
+                remaining.append(filename)
+        missing_files[:] = remaining
+        return {key: filenames for key, filenames in followers.items() if filenames}
+
+    def _link_followers(self, followers: Dict[str, List[str]]):
+        """Link the held back duplicates, downloading those whose first copy failed."""
+        leftovers = []
+        for key, filenames in followers.items():
+            for filename in filenames:
+                item, dl = self._get_download_entry(filename)
+                if not (key in self.content_index and self._link_duplicate(key, item, dl)):
+                    leftovers.append(filename)
+        self._loop_through_missing_files(leftovers)
+
+    def _link_duplicate(self, key: str, item: CatalogItem, dl: DownloadEntry) -> bool:
+        """Create a file from a local copy with the same content instead of downloading it."""
+        source_relative, _ = self.content_index[key]
+        target_relative = self._get_relative_path(item.platform, item.machine_name, dl.filetype)
+        if source_relative not in self.inventory or source_relative == target_relative:
+            return False
+        source = join(self.path, source_relative)
+        target = join(self.path, target_relative)
+
+        self._assure_path_exists(os.path.dirname(target))
+        staging = join(os.path.dirname(target), f".{os.path.basename(target)}.moving")
+        try:
+            shared = False
+            if self.dedupe == 'hardlink':
+                try:
+                    os.link(source, staging)
+                    shared = True
+                except OSError:
+                    pass  # E.g. a filesystem without hardlinks, clone or copy instead
+            if not shared:
+                shared = self._reflink(source, staging)
+            os.replace(staging, target)
+        except OSError as e:
+            self.log_error(f"Could not link {target} to {source}: {e}")
+            if isfile(staging):
+                os.remove(staging)
+            return False
+
+        if self.verbose:
+            self.colorize(f"Linked {target_relative} to identical {source_relative}", "blue")
+        self.inventory.add(target_relative)
+        size = self.inventory.files[target_relative][0]
+        self.metrics.add('deduplicated_files')
+        self.metrics.add('dedupe_transfer_saved_bytes', size)
+        if shared:
+            self.metrics.add('dedupe_storage_saved_bytes', size)
+
+        hashes = {hash_type: self.checksum_cache.get(source, hash_type) for hash_type in CACHED_DIGESTS}
+        hashes = {hash_type: digest for hash_type, digest in hashes.items() if digest}
+        if hashes:
+            self.checksum_cache.put(target, hashes)
+        return True
+
+    def _reflink(self, source: str, target: str) -> bool:
+        """Clone source into target. Returns True if the filesystem shares the storage, otherwise it is copied."""
+        if fcntl is not None:
+            with open(source, 'rb') as fsrc, open(target, 'wb') as fdst:
+                try:
+                    fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+                    return True
+                except OSError:
+                    pass
+        self._copy_file(source, target)
+        return False
 
     def _assure_path_exists(self, path: str):
         """Ensure directory exists."""
         if not path.endswith("/"):
             path += "/"
         directory = os.path.dirname(path)
-        if not os.path.exists(directory):
-            os.makedirs(directory)
-
-    def _get_existing_files_in_folder(self, platform: str) -> List[str]:
-        """Get list of existing files in platform folder."""
-        head = join(self.path, f"{platform}/")
-
-        if not os.path.exists(head):
-            return []
+        os.makedirs(directory, exist_ok=True)
 
-        if platform != "ebook":
-            return [f for f in listdir(head) if isfile(join(head, f))]
+    def _get_relative_path(self, platform: str, machine_name: str, filetype: str) -> str:
+        """Path of a file relative to the download path, ebooks are split up per filetype."""
+        platform = platform.lower()
+        filetype = filetype.lower()
+        if platform == "ebook":
+            return f"ebook/{filetype}/{machine_name}.{filetype}"
+        return f"{platform}/{machine_name}.{filetype}"
+
+    def _get_file_size(self, filename: str) -> int:
+        """Size in bytes of a catalog file, falling back to its human readable size."""
+        machine_name = filename[:filename.rfind('.')]
+        filetype = filename[filename.rfind('.') + 1:]
+        item = self._get_item_object(machine_name)
+        dl = item.lookup(filetype) if item else None
+        if not dl:
+            return 0
+        return dl.file_size or parse_size(dl.human_size)
+
+    def _schedule_downloads(self, missing_files: List[str]):
+        """Order the files to download according to the chosen download order."""
+        if self.download_order == 'smallest':
+            missing_files.sort(key=lambda filename: (self._get_file_size(filename), filename))
+        elif self.download_order == 'largest':
+            missing_files.sort(key=lambda filename: (-self._get_file_size(filename), filename))
+
+    def _check_free_space(self, missing_files: List[str]) -> bool:
+        """Check that temp and download path can hold the files before starting."""
+        sizes = sorted((self._get_file_size(filename) for filename in missing_files), reverse=True)
+        total = sum(sizes)
+        # The temp folder holds at most one file per parallel job at a time
+        needed = {self.path: total}
+        temp_needed = sum(sizes[:self.jobs])
+        if os.stat(self.download_temp_path).st_dev != os.stat(self.path).st_dev:
+            # Plus the files queued up for, or busy in, the verify and move stages
+            needed[self.download_temp_path] = sum(sizes[:3 * self.jobs + 2])
         else:
-            # For ebooks, search recursively
-            filelist = []
-            for root, dirs, files in os.walk(head):
-                filelist.extend(files)
-            return filelist
-
-    def _get_sorted_uniques(self, list_items: List[str]) -> List[str]:
-        """Get sorted unique items from list."""
-        if not list_items:
-            return []
-        return sorted(list(set(list_items)))
-
-    def _loop_through_missing_files(self, missing_files: List[str], max_retries: int = 3):
-        """Download missing files with retries."""
-        for i in range(max_retries):
-            if not missing_files:
-                break
-
-            files_to_remove = []
-            for filename in missing_files:
-                if not self._check_file_against_filter(filename):
-                    files_to_remove.append(filename)
-                    continue
-
-                machine_name = filename[:filename.rfind('.')]
-                filetype = filename[filename.rfind('.') + 1:]
+            needed[self.path] = max(total, temp_needed)
+
+        enough = True
+        for path, nbytes in needed.items():
+            free = shutil.disk_usage(path).free
+            if nbytes > free:
+                error = (f"Not enough free space in {path}: need {nbytes / 1048576:.1f} MB, "
+                         f"have {free / 1048576:.1f} MB")
+                self.colorize(error, "red")
+                self.log_error(error)
+                enough = False
+        return enough
+
+    def _download_stage(self, filename: str) -> Optional[Dict]:
+        """First pipeline stage: download a file to the temp path."""
+        machine_name = filename[:filename.rfind('.')]
+        filetype = filename[filename.rfind('.') + 1:]
 
-                if self.verbose:
-                    print(f"Trying to download file: {filename}")
+        if self.verbose:
+            print(f"Trying to download file: {filename}")
+
+        file_info = self._download(machine_name, filetype)
+        if not file_info:
+            self.colorize(f"FAILED to download: {filename}", "red")
+        return file_info
+
+    def _verify_stage(self, filename: str, file_info: Dict) -> bool:
+        """Second pipeline stage: check the downloaded file against the catalog checksums."""
+        with self.metrics.phase('post_download_hash'):
+            verified = self._checksum_file(file_info)
+        if not verified:
+            self.colorize(f"FAILED on checksums: {filename}", "red")
+            self.metrics.add('checksum_failures')
+        return verified
+
+    def _loop_through_missing_files(self, missing_files: List[str]):
+        """Download missing files with retries, running up to self.jobs files at once."""
+        if not missing_files:
+            return
+        followers = self._deduplicate(missing_files) if self.dedupe else {}
+        if not missing_files:  # Everything was linked to a local copy
+            self._link_followers(followers)
+            return
+        self._schedule_downloads(missing_files)
+        if not self._check_free_space(missing_files):
+            self.colorize(f"Skipping download of {len(missing_files)} files", "red")
+            return
 
-                file_info = self._download(machine_name, filetype)
-                if file_info:
-                    if self._checksum_file(file_info):
-                        self._move_file(file_info)
-                        files_to_remove.append(filename)
-                    else:
-                        self.colorize(f"FAILED on checksums: {filename}", "red")
+        with self.metrics.phase('download_loop'):
+            self._run_pipeline(missing_files)
+
+        if followers:
+            self._link_followers(followers)
+
+    def _run_pipeline(self, filenames: List[str]) -> Set[str]:
+        """Download, verify and move files in overlapping stages connected by bounded queues.
+
+        The next downloads run while earlier files are verified and moved, a full queue holds back
+        the stage feeding it. A file that fails goes back into the download queue after an exponential
+        backoff, until it runs out of attempts. Returns the files that need no more attempts.
+        """
+        if not filenames:
+            return set()
+        downloads = RetryQueue()
+        verifications: queue.Queue = queue.Queue(maxsize=self.jobs)
+        moves: queue.Queue = queue.Queue(maxsize=self.jobs)
+        done: Set[str] = set()
+        attempts = {filename: 0 for filename in filenames}
+        remaining = len(filenames)
+        lock = threading.Lock()
+
+        def finished(filename: str, success: bool, error: Optional[BaseException] = None, retry: bool = True):
+            nonlocal remaining
+            if self._interrupted.is_set():
+                return
+            with lock:
+                if not success:
+                    attempts[filename] += 1
+                    if retry and attempts[filename] <= self.retries and self._is_retryable(error):
+                        delay = self._retry_delay(attempts[filename], error)
+                        self.metrics.add('retries')
+                        if self.verbose:
+                            print(f"Retrying {filename} in {delay:.1f}s "
+                                  f"(attempt {attempts[filename] + 1} of {self.retries + 1})")
+                        downloads.put((filename, None), delay)
+                        return
+                    reason = str(error) if error else "no download in the catalog"
+                    self.failed_files[filename] = f"{reason} ({attempts[filename]} attempts)"
                 else:
-                    self.colorize(f"FAILED to download: {filename}", "red")
-
+                    done.add(filename)
+                    self.failed_files.pop(filename, None)
+                remaining -= 1
                 if self.verbose:
-                    print(f"There are {len(missing_files)} files left to download")
-
-            # Remove successfully processed files
-            for filename in files_to_remove:
-                if filename in missing_files:
-                    missing_files.remove(filename)
-
-    def _handle_platform(self, platform: str):
-        """Handle downloads for a specific platform."""
-        if self.verbose:
-            print(f"\nProcessing platform: {platform}")
-
-        local_files = self._get_existing_files_in_folder(platform)
-        filename_matches = set()
-        filename_no_matches = set()
+                    print(f"There are {remaining} files left to download")
+                if not remaining:
+                    downloads.close()
+
+        def download(filename: str, _) -> Optional[Tuple[str, Dict]]:
+            if not self._check_file_against_filter(filename):
+                finished(filename, True)
+                return None
+            file_info = self._download_stage(filename)
+            if not file_info:
+                finished(filename, False, retry=False)
+                return None
+            return filename, file_info
+
+        def verify(filename: str, file_info: Dict) -> Optional[Tuple[str, Dict]]:
+            if not self._verify_stage(filename, file_info):
+                finished(filename, False, IOError("checksum mismatch"))
+                return None
+            return filename, file_info
+
+        def move(filename: str, file_info: Dict) -> None:
+            self._move_file(file_info)
+            finished(filename, True)
+
+        for filename in filenames:
+            downloads.put((filename, None))
+
+        verifier = threading.Thread(target=self._pipeline_stage, args=('verify', verifications, moves, verify, finished))
+        mover = threading.Thread(target=self._pipeline_stage, args=('move', moves, None, move, finished))
+        verifier.start()
+        mover.start()
+        executor = ThreadPoolExecutor(max_workers=self.jobs)
+        completed = False
+        try:
+            for _ in range(self.jobs):
+                executor.submit(self._pipeline_stage, 'download', downloads, verifications, download, finished)
+            executor.shutdown(wait=True)
+            completed = True
+        finally:
+            if not completed:
+                # Interrupted: running transfers stop at their next chunk and keep their .part files
+                self._interrupted.set()
+                downloads.close(discard=True)
+                executor.shutdown(wait=True)
+            verifications.put(None)
+            verifier.join()
+            moves.put(None)
+            mover.join()
+        return done
+
+    def _pipeline_stage(self, name: str, inbox, outbox: Optional[queue.Queue], work, finished):
+        """Worker loop of one pipeline stage, runs until its inbox hands out None."""
+        while True:
+            item = inbox.get()
+            if item is None:
+                return
+            if self._interrupted.is_set():
+                continue  # Drain the queue so the stage feeding it never blocks
+            filename, file_info = item
+            try:
+                with self.metrics.stage(name, inbox.qsize()):
+                    result = work(filename, file_info)
+            except Exception as e:
+                if self._interrupted.is_set():
+                    continue
+                self.colorize(f"FAILED to {name}: {filename}", "red")
+                self.log_error(f"Failure to {name} {filename}: {e}")
+                finished(filename, False, e)
+                continue
+            if result is not None and outbox is not None:
+                outbox.put(result)
+
+    def _verify_existing_files(self, verify_jobs: List[Tuple[str, str, str, int]]) -> List[bool]:
+        """Check existing files concurrently and sort them into the md5 match lists, returns the verdicts."""
+        def verify(job: Tuple[str, str, str, int]) -> bool:
+            machine_name, relative_path, md5_hash, size = job
+            try:
+                return self._verify_local_file(relative_path, md5_hash, size)
+            except (OSError, sqlite3.Error):
+                return False
+
+        # hashlib releases the GIL while hashing large buffers, so threads scale across cores
+        hashed_before = self.metrics.get('hashed_bytes')
+        with self.metrics.phase('local_verify'), ThreadPoolExecutor(max_workers=self.verify_workers) as executor:
+            verdicts = list(executor.map(verify, verify_jobs))
+        for (machine_name, _, _, _), verdict in zip(verify_jobs, verdicts):
+            if verdict:
+                self.md5_match_list.append(machine_name)
+            else:
+                self.md5_no_match_list.append(machine_name)
+        self.metrics.add('verify_bytes', self.metrics.get('hashed_bytes') - hashed_before)
+        return verdicts
+
+    def _build_plan(self, keys: List[str]) -> DownloadPlan:
+        """Diff the whole catalog against the local files in one pass, verifying existing files on the way."""
+        plan = DownloadPlan(keys)
+        planned: Set[str] = set()
+        planned_content: Dict[str, str] = {}  # content key -> path of its first planned download
+        to_verify: List[Tuple[PlanEntry, int]] = []  # With the exact byte size, when the catalog has one
+
+        for item in self.catalog.items.values():
+            for dl in item.download_struct:
+                if not dl.filetype:  # Skip files with no extension
+                    continue
+                relative_path = self._get_relative_path(item.platform, item.machine_name, dl.filetype)
+                if relative_path in planned:
+                    continue
+                planned.add(relative_path)
 
-        head = join(self.path, f"{platform}/")
+                entry = PlanEntry('skip', item.platform, item.machine_name, dl.filetype, relative_path,
+                                  dl.file_size or parse_size(dl.human_size), dl.md5)
+                plan.entries.append(entry)
 
-        for bundle in self.data:
-            for item in bundle['items']:
-                if item.get('platform') != platform:
+                if relative_path in self.inventory:
+                    if self.verify_checksum_on_existing_files:
+                        to_verify.append((entry, dl.file_size))
                     continue
 
-                for dl_str in item['download_struct']:
-                    url_file_type = self._get_filetype_from_url(dl_str['web'])
-                    machine_name = item['machine_name']
-                    filename = f"{machine_name}.{url_file_type}"
-
-                    if not url_file_type:  # Skip files with no extension
-                        continue
-
-                    if filename in local_files:
-                        filename_matches.add(machine_name)
-
-                        # Verify existing files if requested
-                        if self.verify_checksum_on_existing_files:
-                            md5_hash = dl_str['md5']
-                            if platform == "ebook":
-                                file_path = join(head, url_file_type)
-                                full_filename = f"{machine_name}.{url_file_type.lower()}"
-                            else:
-                                file_path = head
-                                full_filename = f"{machine_name}.{url_file_type.lower()}"
-
-                            try:
-                                result = self._verify_checksum(file_path, full_filename, md5_hash)
-                                if result['verdict']:
-                                    self.md5_match_list.append(machine_name)
-                                else:
-                                    self.md5_no_match_list.append(machine_name)
-                            except OSError:
-                                self.md5_no_match_list.append(machine_name)
+                key = self._content_key(dl) if self.dedupe else None
+                if key and key in self.content_index:
+                    entry.action, entry.source = 'dedupe', self.content_index[key][0]
+                elif key and key in planned_content:
+                    entry.action, entry.source = 'dedupe', planned_content[key]
+                else:
+                    entry.action = 'download'
+                    if key:
+                        planned_content[key] = relative_path
+
+        # One verification pool for the files of every platform
+        verdicts = self._verify_existing_files([(entry.machine_name, entry.path, entry.md5, size)
+                                                for entry, size in to_verify])
+        for (entry, _), verdict in zip(to_verify, verdicts):
+            if not verdict:
+                entry.action = 'redownload'
+        if self.dedupe:
+            self._forget_failed_content(self.md5_no_match_list)
+            # Dedupes planned from a file that failed verification download it once and link the rest to that
+            replacements = {entry.path: None for entry, _ in to_verify if entry.action == 'redownload'}
+            for entry in plan.entries:
+                if entry.action == 'dedupe' and entry.source in replacements:
+                    if replacements[entry.source] is None:
+                        replacements[entry.source] = entry.path
+                        entry.action, entry.source = 'download', None
                     else:
-                        filename_no_matches.add(filename)
-
-        # Print statistics
-        print(f"Currently have {len(local_files)} local files in folder {platform}")
-        print(f"Found {len(filename_matches)} matches on filename")
-        print(f"Found {len(filename_no_matches)} unique missing files")
-        print(f"Found {len(self.md5_match_list)} verified hashes")
-        print(f"Found {len(self.md5_no_match_list)} failed hashes")
-
-        # Download missing files
-        if filename_no_matches:
-            missing_list = self._get_sorted_uniques(list(filename_no_matches))
-            self._loop_through_missing_files(missing_list)
-
-        if self.md5_no_match_list:
-            failed_list = self._get_sorted_uniques(self.md5_no_match_list)
-            # Convert machine names back to filenames for redownload
-            failed_filenames = []
-            for machine_name in failed_list:
-                item = self._get_item_object(machine_name)
-                if item and item['download_struct']:
-                    url_type = self._get_filetype_from_url(item['download_struct'][0]['web'])
-                    failed_filenames.append(f"{machine_name}.{url_type}")
-
-            self._loop_through_missing_files(failed_filenames)
-
-        print(f"Completed processing platform: {platform}")
+                        entry.source = replacements[entry.source]
+
+        plan.entries.sort(key=lambda entry: entry.path)
+        return plan
+
+    def _load_plan(self, filename: str) -> DownloadPlan:
+        """Load a saved plan with its catalog, dropping files that were put in place since it was made."""
+        plan = DownloadPlan.read(filename)
+        self.colorize(f"Applying plan {filename} from {datetime.fromtimestamp(plan.created):%Y-%m-%d %H:%M:%S}",
+                      "yellow")
+        with self.metrics.phase('parse'):
+            self.catalog = self.catalog_store.load_catalog(plan.keys)
+        self._scan_local_files(sorted({platform.lower() for platform in plan.platforms()}))
+
+        for entry in plan.entries:
+            stat = self.inventory.files.get(entry.path)
+            if entry.action in ('download', 'dedupe') and stat and (not entry.size or stat[0] == entry.size):
+                entry.action = 'skip'
+            elif (entry.action == 'redownload' and stat
+                  and self.checksum_cache.get(join(self.path, entry.path), 'md5') == entry.md5):
+                entry.action = 'skip'  # Replaced by a verified download since
+        if self.dedupe:
+            # The plan found these files corrupt, they must not be the source of a link
+            corrupt = {entry.path for entry in plan.entries if entry.action == 'redownload'}
+            self.content_index = {key: source for key, source in self.content_index.items() if source[0] not in corrupt}
+        return plan
+
+    def _print_plan(self, plan: DownloadPlan):
+        """Show what the plan does per platform and in total."""
+        def describe(totals: Dict[str, Dict[str, int]]) -> str:
+            return ', '.join(f"{totals[action]['files']} to {action} ({totals[action]['bytes'] / 1048576:.1f} MB)"
+                             for action in PLAN_ACTIONS if action != 'skip')
+
+        for platform in plan.platforms():
+            totals = plan.summary(platform)
+            print(f"\nPlatform {platform}: {self.inventory.count(platform.lower())} local files, "
+                  f"{totals['skip']['files']} up to date")
+            print(f"  {describe(totals)}")
+
+        totals = plan.summary()
+        self.colorize(f"Plan: {describe(totals)}, {totals['skip']['files']} up to date", "green")
+        if self.dry_run:
+            for entry in plan.pending():
+                source = f" from {entry.source}" if entry.source else ""
+                print(f"[DRY RUN] Would {entry.action} {entry.path}{source} ({entry.size / 1048576:.1f} MB)")
+
+    def _apply_plan(self, plan: DownloadPlan):
+        """Download, redownload and dedupe the pending files of a plan."""
+        # Dedupe entries go through the download loop too, it links them once their source exists
+        self._loop_through_missing_files([entry.filename for entry in plan.pending()])
 
     def run(self):
         """Main execution method."""
+        # JSON printed with '-' owns stdout so it can be piped, everything meant for people goes to stderr
+        if '-' in (self.args.export_plan, self.args.metrics_json):
+            sys.stdout = sys.stderr
+        try:
+            self._run()
+        finally:
+            sys.stdout = self._stdout
+
+    def _run(self):
         # Clear screen and show header
-        clear_command = 'cls' if os.name == 'nt' else 'clear'
         if not self.args.quiet:
-            os.system(clear_command)
+            if os.name == 'nt':
+                os.system('cls')
+            elif sys.stdout.isatty():
+                sys.stdout.write('\033[H\033[2J')
             self.colorize(header, 'magenta')
             self.colorize(VERSION, 'green')
 
         # Check cookie
         self._check_cookie()
 
-        # Load data
-        offline = False
-        raw_json = []
+        self.catalog_store = CatalogStore(CATALOG_STORE_FILE)
+        if self.catalog_store.needs_reindex:
+            self._reindex_catalog_store()
+        if self.args.import_json:
+            self._import_data_json(self.args.import_json)
+        elif isfile('data.json') and self.catalog_store.is_empty():
+            self._import_data_json('data.json')
 
-        if isfile('data.json'):
-            self.colorize("data.json file found, using offline data.", "yellow")
-            with open('data.json') as file:
-                raw_json = json.load(file)
-                offline = True
+        try:
+            if self.watch_interval:
+                self._watch()
+            else:
+                self._sync()
+        finally:
+            self.transport.close()
+            self.checksum_cache.close()
+            self.catalog_store.close()
+            if self._error_log is not None:
+                self._error_log.close()
+
+        print("\nAll done!")
 
-        if not offline:
+    def _watch(self):
+        """Stay resident and sync every watch interval, or right away on SIGHUP/SIGUSR1, until SIGINT/SIGTERM."""
+        def resync(signum, frame):
+            self._wake.set()
+
+        def stop(signum, frame):
+            self._stopping = True
+            self._wake.set()
+
+        for name in ('SIGHUP', 'SIGUSR1'):
+            if hasattr(signal, name):
+                signal.signal(getattr(signal, name), resync)
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        while not self._stopping:
+            self._update_status('syncing', last_sync_started=time.time())
+            try:
+                self._check_cookie()
+                self._sync()
+                self._update_status('idle', syncs=self.status['syncs'] + 1, last_sync_ok=True, last_error=None,
+                                    files_downloaded=int(self.metrics.get('files_downloaded')),
+                                    failed_files=sorted(self.failed_files),
+                                    errors=int(self.metrics.get('errors')))
+            except (Exception, SystemExit) as e:  # Fatal errors of a single sync, e.g. an expired cookie
+                self.log_error(f"Sync failed: {e!r}")
+                self.colorize(f"Sync failed: {e!r}", "red")
+                self._update_status('idle', failed_syncs=self.status['failed_syncs'] + 1,
+                                    last_sync_ok=False, last_error=repr(e))
+
+            next_sync = time.time() + self.watch_interval
+            self._update_status(self.status['state'], last_sync_finished=time.time(), next_sync=next_sync)
+            if self.verbose:
+                print(f"Next sync at {datetime.fromtimestamp(next_sync):%Y-%m-%d %H:%M:%S}, "
+                      f"send SIGHUP to sync now")
+            self._wake.wait(self.watch_interval)
+            self._wake.clear()
+
+        self._update_status('stopped')
+
+    def _update_status(self, state: str, **fields):
+        """Record the daemon state and write it to the status file for health checks."""
+        self.status.update(fields, state=state, updated=time.time())
+        if not self.status_file:
+            return
+        temp_filename = self.status_file + '.tmp'
+        with open(temp_filename, 'w') as f:
+            json.dump(self.status, f, indent=2)
+        os.replace(temp_filename, self.status_file)
+
+    def _sync(self):
+        """One pass over the library: refresh the catalog, plan against the local files, then apply the plan."""
+        # Every sync reports on its own, the session, catalog and inventory carry over
+        self.metrics = Metrics()
+        self.filename_match_list = set()
+        self.filename_no_match_list = set()
+        self.md5_match_list = []
+        self.md5_no_match_list = []
+        self.failed_files = {}
+        self._refreshed_keys = set()
+        connections_opened = self.transport.connections_opened
+        connections_reused = self.transport.connections_reused
+
+        if self.args.apply_plan:
+            plan = self._load_plan(self.args.apply_plan)
+        else:
+            keys = self._refresh_catalog()
+            if self.args.prune_checksum_cache:
+                pruned = self.checksum_cache.prune()
+                self.colorize(f"Pruned {pruned} stale entries from the checksum cache", "yellow")
+            self._scan_local_files(sorted({platform.lower() for platform in self.catalog.platforms}))
+            with self.metrics.phase('plan'):
+                plan = self._build_plan(keys)
+
+        self._print_plan(plan)
+        if self.args.export_plan:
+            with redirect_stdout(self._stdout):
+                plan.write(self.args.export_plan)
+        elif not self.dry_run:
+            self._apply_plan(plan)
+
+        if self.failed_files:
+            self.colorize(f"{len(self.failed_files)} files could not be downloaded:", "red")
+            for filename, error in sorted(self.failed_files.items()):
+                self.colorize(f"  {filename}: {error}", "red")
+        self.metrics.add('failed_files', len(self.failed_files))
+        if self.metrics.get('deduplicated_files'):
+            self.colorize(f"Deduplicated {int(self.metrics.get('deduplicated_files'))} files, saved "
+                          f"{self.metrics.get('dedupe_transfer_saved_bytes') / 1048576:.1f} MB of transfer and "
+                          f"{self.metrics.get('dedupe_storage_saved_bytes') / 1048576:.1f} MB of storage", "green")
+        if self.verbose:
+            print(f"HTTP connections opened: {self.transport.connections_opened}, "
+                  f"reused: {self.transport.connections_reused}")
+        self.metrics.add('connections_opened', self.transport.connections_opened - connections_opened)
+        self.metrics.add('connections_reused', self.transport.connections_reused - connections_reused)
+        if self.args.metrics_json:
+            with redirect_stdout(self._stdout):
+                self.metrics.write_json(self.args.metrics_json)
+        if self.args.prometheus_textfile:
+            self.metrics.write_prometheus(self.args.prometheus_textfile)
+
+    def _refresh_catalog(self) -> List[str]:
+        """Bring the order store up to date and load the catalog, returns the library's keys."""
+        offline = self.args.offline
+        failed_keys = []
+        fetched = 0
+        if offline:
+            self.colorize("Offline mode, using cached order data.", "yellow")
+            keys = self.catalog_store.all_keys()
+        else:
             if self.verbose:
                 print("Fetching your keys...")
 
-            library_res = self._get_library()
+            with self.metrics.phase('library_fetch'):
+                library_res = self._get_library()
 
             if "Humble Bundle - Log In" in library_res.text:
                 self.colorize("Not logged in, check your cookie!", 'red')
@@ -659,38 +2547,57 @@ class HumbleBundleDownloader:
                 self.colorize("No keys found, check your cookie!", 'red')
                 sys.exit(1)
 
-            if self.verbose:
-                self.colorize(f"Got {len(keys)} keys, fetching data for each", 'green')
-
-            for i, key in enumerate(keys):
-                raw_json.append(self._api_call(key))
-                if self.verbose:
-                    print(f"{key}: {i + 1}/{len(keys)}")
+            cached_keys = self.catalog_store.fresh_keys(keys, self.order_cache_ttl)
+            missing_keys = [key for key in keys if key not in cached_keys]
 
-        # Parse data
-        self.data = self._parse_json(raw_json)
+            if self.verbose:
+                self.colorize(f"Got {len(keys)} keys, {len(cached_keys)} cached, "
+                              f"fetching data for {len(missing_keys)}", 'green')
+
+            # Orders that fail to refresh keep using any cached copy in the store
+            with self.metrics.phase('order_fetch'):
+                failed_keys = self._fetch_orders(missing_keys)
+            fetched = len(missing_keys) - len(failed_keys)
+            self.metrics.add('orders_fetched', fetched)
+            self.metrics.add('orders_failed', len(failed_keys))
+
+            if failed_keys:
+                self.colorize(f"Failed to fetch {len(failed_keys)} of {len(keys)} orders:", 'red')
+                for key in failed_keys:
+                    self.colorize(f"  {key}", 'red')
+
+        if self.args.export_json:
+            self._export_data_json(self.args.export_json)
+
+        # Load only the part of the catalog this run works on, a resident process keeps it while no order changed
+        if fetched or keys != self._catalog_keys:
+            filetypes = None if "*" in self.allowed_filetypes else self.allowed_filetypes
+            with self.metrics.phase('parse'):
+                self.catalog = self.catalog_store.load_catalog(keys, self.args.platform, filetypes, self.args.bundle)
+            self._catalog_keys = keys
 
         # Show detected platforms
-        unique_platforms = sorted(list(set(self.raw_platforms)))
         if self.verbose:
             self.colorize("Platforms detected:", "yellow")
-            for platform in unique_platforms:
+            for platform in sorted(self.catalog.platforms):
                 self.colorize(f"  {platform}", "yellow")
+        return keys
 
-        # Save data for offline use
-        if self.verbose and not offline:
-            with open('data.json', 'w') as f:
-                json.dump(raw_json, f)
 
-        # Process each platform
-        for platform in unique_platforms:
-            self._handle_platform(platform)
-
-        print("\nAll done!")
+    def _scan_local_files(self, folders: List[str]):
+        """Snapshot the platform folders, later syncs only list changed directories."""
+        with self.metrics.phase('filesystem_scan'):
+            if self._scanned:
+                self.metrics.add('directories_rescanned', self.inventory.refresh(folders))
+            else:
+                self.inventory.scan(folders)
+                self._scanned = True
+        if self.dedupe:
+            self._build_content_index()
 
 
-def main():
-    """Main entry point."""
+def build_parser() -> argparse.ArgumentParser:
+    """Command line arguments of the downloader."""
     parser = argparse.ArgumentParser(description='HumbleBundle Downloader')
     group = parser.add_mutually_exclusive_group()
     group.add_argument('-q', '--quiet', help='Runs quietly and only reports when done',
@@ -704,6 +2611,23 @@ def main():
     parser.add_argument('-i', '--ignore-downloaded-checksum',
                         help='Skips checksum checks for downloaded files',
                         action="store_true", required=False)
+    parser.add_argument('--verify-level', choices=VERIFY_LEVELS, default=None,
+                        help='How closely existing files are checked: none, size, sample (size plus a fingerprint '
+                             'of a few blocks) or full MD5 hashes. Doubtful files are always fully hashed '
+                             '(default: full, none with -n)')
+    parser.add_argument('--reverify',
+                        help='Ignores cached checksums and fully re-hashes local files, overrides --verify-level size/sample',
+                        action="store_true", required=False)
+    parser.add_argument('--prune-checksum-cache',
+                        help='Removes checksum cache entries for missing or changed files',
+                        action="store_true", required=False)
+    parser.add_argument('--verify-workers', type=int, default=os.cpu_count() or 4,
+                        help='Number of local files hashed in parallel (default: number of CPUs)')
+    parser.add_argument('--hash-block-size', type=int, default=1024,
+                        help='Read size in KiB when hashing files (default: 1024)')
+    parser.add_argument('--mmap',
+                        help='Hashes files through mmap instead of read calls',
+                        action="store_true", required=False)
     parser.add_argument('-d', '--dry-run',
                         help='Does a dry run that skips actual download',
                         action="store_true", required=False)
@@ -722,8 +2646,82 @@ def main():
     parser.add_argument('-o', '--other',
                         help='Download only zip files for video/other content',
                         action="store_true", required=False)
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Number of files to download in parallel (default: 1)')
+    parser.add_argument('--download-order', choices=DOWNLOAD_ORDERS, default='name',
+                        help='Order of downloads: by name, smallest first or largest first (default: name)')
+    parser.add_argument('--bandwidth-limit', metavar='RATE', type=size_argument,
+                        help='Combined download rate limit per second, e.g. 500K or 10M')
+    parser.add_argument('--dedupe', choices=DEDUPE_MODES,
+                        help='Links files with the same content as a local file instead of downloading them again')
+    parser.add_argument('--stage-on-destination',
+                        help='Downloads into a temp folder inside the download path, so finished files are renamed instead of copied',
+                        action="store_true", required=False)
+    parser.add_argument('--segments', type=int, default=1,
+                        help='Download large files as this many parallel byte range segments (default: 1)')
+    parser.add_argument('--segment-threshold', metavar='SIZE', type=size_argument, default='64M',
+                        help='Minimum file size for segmented downloads (default: 64M)')
+    parser.add_argument('--chunk-size', type=int, default=1024,
+                        help='Size in KiB of the buffer downloads are streamed through (default: 1024)')
+    parser.add_argument('--preallocate',
+                        help='Reserves the full file size on disk before downloading',
+                        action="store_true", required=False)
+    parser.add_argument('--progress-rate', type=float, default=10.0,
+                        help='Maximum progress bar redraws per second (default: 10)')
+    parser.add_argument('--retries', type=int, default=2,
+                        help='Retries per file and API call after connection errors, 429 and 5xx responses (default: 2)')
+    parser.add_argument('--retry-backoff', type=float, default=2.0,
+                        help='Base delay in seconds of the exponential backoff between retries (default: 2)')
+    parser.add_argument('--connect-timeout', type=float, default=10.0,
+                        help='Seconds to wait for a connection to be established (default: 10)')
+    parser.add_argument('--read-timeout', type=float, default=60.0,
+                        help='Seconds to wait for data from an established connection (default: 60)')
+    parser.add_argument('--platform', action='append',
+                        help='Only handle this platform, e.g. ebook or audio (can be repeated)')
+    parser.add_argument('--bundle',
+                        help='Only handle the bundle with this machine name')
+    parser.add_argument('--import-json', metavar='FILE',
+                        help='Imports orders from a data.json file into the catalog store')
+    parser.add_argument('--export-json', metavar='FILE',
+                        help='Exports all stored orders to a data.json file')
+    parser.add_argument('--offline',
+                        help='Uses the cached order data instead of fetching the library, orders whose download '
+                             'links expired are still refetched',
+                        action="store_true", required=False)
+    parser.add_argument('--order-cache-ttl', type=float, default=168.0,
+                        help='Hours before a cached order is fetched again, 0 refetches all (default: 168)')
+    parser.add_argument('--batch-size', type=int, default=1,
+                        help='Orders fetched per API request through the bulk order endpoint (default: 1)')
+    parser.add_argument('--api-base-url', default=API_BASE_URL,
+                        help='Base URL of the Humble Bundle API, e.g. a local server for testing')
+    parser.add_argument('--export-plan', metavar='FILE',
+                        help='Writes the planned downloads, redownloads, dedupes and skips as JSON instead of running them, '
+                             '- prints them to stdout and sends all other output to stderr')
+    parser.add_argument('--apply-plan', metavar='FILE',
+                        help='Runs a plan written by --export-plan without fetching the library or verifying local files')
+    parser.add_argument('--watch', type=float, metavar='SECONDS',
+                        help='Stays resident and syncs every SECONDS, SIGHUP or SIGUSR1 syncs right away')
+    parser.add_argument('--status-file',
+                        help='JSON file with the state of the last sync for health checks, updated in --watch mode')
+    parser.add_argument('--metrics-json', metavar='FILE',
+                        help='Writes per-phase timings and throughput as JSON, - prints to stdout and sends all other '
+                             'output to stderr')
+    parser.add_argument('--prometheus-textfile', metavar='FILE',
+                        help='Writes the run metrics in the Prometheus textfile collector format')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='Number of orders to fetch in parallel (default: 4)')
+    parser.add_argument('--rate-limit', type=float, default=8.0,
+                        help='Maximum order API calls per second, 0 disables (default: 8)')
+
+    return parser
+
 
+def main():
+    """Main entry point."""
+    parser = build_parser()
     args = parser.parse_args()
+    if args.export_plan == '-' and args.metrics_json == '-':
+        parser.error("--export-plan and --metrics-json can't both print to stdout")
 
     # Create and run the downloader
     downloader = HumbleBundleDownloader(args)